@@ -0,0 +1,160 @@
+"""
+Benchmarks for the Haml example
+
+Generates a corpus of synthetic templates and measures:
+    - translate time (HamlCompiler only)
+    - cold import (no cached bytecode)
+    - warm import (from the tagged pyc)
+    - render throughput and peak memory
+
+Results are printed as JSON so they can be compared between releases:
+    python -m examples.haml.bench --templates 50 --size 200 > results.json
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import import_haml
+
+PACKAGE = '_haml_bench_corpus'
+
+def generate_template(size, nesting, attributes, rng):
+    """
+    Returns the source of a template with @size tags nested
+    at most @nesting deep, each with @attributes attributes
+    """
+
+    lines = []
+    depth = 0
+    for i in range(size):
+        attrs = ', '.join("'attr-{}': value_{}".format(j, j % 4) for j in range(attributes))
+        attrs = '{' + attrs + '}' if attrs else ''
+        indent = '  ' * depth
+
+        kind = rng.randrange(4)
+        if kind == 0 and depth < nesting:
+            lines.append('{}%div.nested#n{}{}'.format(indent, i, attrs))
+            depth += 1
+            continue
+        elif kind == 1:
+            lines.append('{}%p.text{} Some static text number {}'.format(indent, attrs, i))
+        elif kind == 2:
+            lines.append('{}%span{}= value_{}'.format(indent, attrs, i % 4))
+        else:
+            lines.append('{}- for x in items:'.format(indent))
+            lines.append('{}  %li{}= x'.format(indent, attrs))
+
+        if depth and rng.random() < 0.3:
+            depth -= 1
+    return '\n'.join(lines) + '\n'
+
+def generate_corpus(directory, templates, **kwargs):
+    """
+    Writes a package of templates into @directory
+    Returns (package directory, module names)
+    """
+
+    rng = random.Random(0)
+    package = os.path.join(directory, PACKAGE)
+    os.mkdir(package)
+    open(os.path.join(package, '__init__.py'), 'w').close()
+
+    names = []
+    for i in range(templates):
+        name = 'template_{}'.format(i)
+        with open(os.path.join(package, name + '.haml'), 'w') as file:
+            file.write(generate_template(rng = rng, **kwargs))
+        names.append(name)
+    return package, names
+
+def unload():
+    for name in list(sys.modules):
+        if name.startswith(PACKAGE + '.'):
+            del sys.modules[name]
+    importlib.invalidate_caches()
+
+def import_all(names):
+    start = time.perf_counter()
+    modules = [importlib.import_module('{}.{}'.format(PACKAGE, n)) for n in names]
+    return time.perf_counter() - start, modules
+
+def bench(templates, size, nesting, attributes, renders):
+    results = dict(
+        python = sys.version.split()[0],
+        compiler_magic = import_haml.HamlCompiler.MAGIC,
+        parameters = dict(templates = templates, size = size, nesting = nesting, attributes = attributes, renders = renders),
+    )
+    variables = dict(value_0 = 'a', value_1 = 1, value_2 = None, value_3 = ['b', 'c'], items = range(3))
+
+    with tempfile.TemporaryDirectory() as directory:
+        package, names = generate_corpus(directory, templates, size = size, nesting = nesting, attributes = attributes)
+        paths = [os.path.join(package, n + '.haml') for n in names]
+        sys.path.insert(0, directory)
+        dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = False
+
+        try:
+            start = time.perf_counter()
+            for path in paths:
+                import_haml.HamlCompiler(path)
+            results['translate'] = time.perf_counter() - start
+
+            unload()
+            shutil.rmtree(os.path.join(package, '__pycache__'), ignore_errors = True)
+            results['cold_import'], modules = import_all(names)
+
+            unload()
+            results['warm_import'], modules = import_all(names)
+
+            start = time.perf_counter()
+            for _ in range(renders):
+                for module in modules:
+                    module.render(**variables)
+            elapsed = time.perf_counter() - start
+            results['render'] = dict(
+                seconds = elapsed,
+                per_second = renders * len(modules) / elapsed,
+            )
+
+            tracemalloc.start()
+            for module in modules:
+                module.render(**variables)
+            results['render']['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        finally:
+            unload()
+            sys.path.remove(directory)
+            sys.dont_write_bytecode = dont_write_bytecode
+
+    return results
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument('--templates', type = int, default = 20, help = 'number of templates')
+    parser.add_argument('--size', type = int, default = 100, help = 'tags per template')
+    parser.add_argument('--nesting', type = int, default = 5, help = 'maximum nesting depth')
+    parser.add_argument('--attributes', type = int, default = 2, help = 'attributes per tag')
+    parser.add_argument('--renders', type = int, default = 20, help = 'renders per template')
+    parser.add_argument('--output', help = 'write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    results = bench(args.templates, args.size, args.nesting, args.attributes, args.renders)
+    output = json.dumps(results, indent = 2, sort_keys = True)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
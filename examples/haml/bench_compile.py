@@ -0,0 +1,172 @@
+"""
+Compile benchmarks for the Haml example
+
+Measures the compiling side of import_anything on generated templates,
+best of --repeat runs, printed as JSON:
+    batch:      a HamlCompiler per file, one Compiler.translate_many()
+                batch and Loader.precompile() (including bytecode writes)
+    nodes:      make_ast_tree() and compile() of text heavy templates,
+                with static text yielded as lines of python or as nodes
+    remap:      make_code() of the templates and of the largest stdlib
+                modules (unchanged), with the line numbers remapped on
+                the code objects (Compiler.remap_code) or in the AST
+
+    python -m examples.haml.bench_compile batch --templates 1000 --size 10
+    python -m examples.haml.bench_compile nodes --templates 30 --size 200
+    python -m examples.haml.bench_compile remap --templates 30 --size 200
+"""
+
+import argparse
+import ast
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import import_anything
+
+from . import bench
+from .import_haml import HamlCompiler
+
+def best_of(repeat, function):
+    """
+    Returns the shortest time of @repeat calls of @function
+    """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def corpus(directory, templates, size):
+    """
+    Returns the paths of @templates generated templates in @directory
+    """
+
+    package, names = bench.generate_corpus(directory, templates, size = size, nesting = 3, attributes = 1)
+    return [os.path.join(package, n + '.haml') for n in names]
+
+class NodeHamlCompiler(HamlCompiler):
+    """
+    HamlCompiler yielding each line of static text as an ast.stmt
+    """
+
+    TEXT_RE = re.compile(r'( *)__stack\.add_text\((.*), escape = False\)')
+
+    def translate(self, file):
+        for lineno, line in super().translate(file):
+            match = isinstance(line, str) and self.TEXT_RE.fullmatch(line)
+            if match:
+                try:
+                    text = ast.literal_eval(match.group(2))
+                except (ValueError, SyntaxError):
+                    # code rather than text (!=)
+                    pass
+                else:
+                    call = ast.Call(
+                        func = ast.Attribute(ast.Name('__stack', ast.Load()), 'add_text', ast.Load()),
+                        args = [ast.Constant(text)],
+                        keywords = [ast.keyword('escape', ast.Constant(False))],
+                    )
+                    line = ast.Expr(call, lineno = lineno, col_offset = len(match.group(1)))
+            yield lineno, line
+
+class IdentityCompiler(import_anything.Compiler):
+    """
+    Compiles python as it is
+    """
+
+    def translate(self, file):
+        for lineno, line in enumerate(file, 1):
+            yield lineno, line.rstrip('\n')
+
+def generate_text_template(size, rng):
+    """
+    Returns the source of a template with @size
+    sections of a few lines of static text each
+    """
+
+    lines = []
+    for i in range(size):
+        lines.append('%div.section#s{}'.format(i))
+        for j in range(rng.randrange(1, 6)):
+            lines.append('  Some static text, line {} of section {}'.format(j, i))
+        lines.append('  %p= value_{}'.format(i % 4))
+    return '\n'.join(lines) + '\n'
+
+def bench_batch(args):
+    with tempfile.TemporaryDirectory() as directory:
+        paths = corpus(directory, args.templates, args.size)
+
+        dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = False
+        try:
+            return dict(
+                separate = best_of(args.repeat, lambda: [HamlCompiler(p) for p in paths]),
+                batch = best_of(args.repeat, lambda: list(HamlCompiler.translate_many(paths))),
+                precompile = best_of(args.repeat, lambda: list(import_anything.Loader.precompile(paths, compiler = HamlCompiler))),
+            )
+        finally:
+            sys.dont_write_bytecode = dont_write_bytecode
+
+def bench_nodes(args):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.templates):
+            paths.append(os.path.join(directory, 'text_{}.haml'.format(i)))
+            with open(paths[-1], 'w') as file:
+                file.write(generate_text_template(args.size, rng))
+
+        results = {}
+        for name, compiler in (('text', HamlCompiler), ('nodes', NodeHamlCompiler)):
+            compilers = [compiler(p) for p in paths]
+            results[name] = best_of(args.repeat, lambda: [compile(c.make_ast_tree(), c.path, 'exec') for c in compilers])
+        return results
+
+def bench_remap(args):
+    library = os.path.dirname(os.__file__)
+    modules = [os.path.join(library, n) for n in os.listdir(library) if n.endswith('.py')]
+    modules = sorted(modules, key = os.path.getsize)[-10:]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        templates = corpus(directory, args.templates, args.size)
+        for name, compiler, paths in (('templates', HamlCompiler, templates), ('stdlib', IdentityCompiler, modules)):
+            for remap in (False, True):
+                # passes always go through the AST
+                variant = type(compiler.__name__, (compiler,), dict(remap_code = remap, passes = ()))
+                compilers = [variant(p) for p in paths]
+                key = '{}_{}'.format(name, 'code' if remap else 'ast')
+                results[key] = best_of(args.repeat, lambda: [c.make_code() for c in compilers])
+    return results
+
+BENCHMARKS = {
+    'batch': bench_batch,
+    'nodes': bench_nodes,
+    'remap': bench_remap,
+}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', choices = sorted(BENCHMARKS))
+    parser.add_argument('--templates', type = int, default = 30, help = 'number of templates')
+    parser.add_argument('--size', type = int, default = 100, help = 'tags per template')
+    parser.add_argument('--repeat', type = int, default = 7, help = 'runs, the best is reported')
+    args = parser.parse_args(argv)
+
+    results = dict(
+        python = sys.version.split()[0],
+        benchmark = args.benchmark,
+        parameters = dict(templates = args.templates, size = args.size, repeat = args.repeat),
+        seconds = BENCHMARKS[args.benchmark](args),
+    )
+    print(json.dumps(results, indent = 2, sort_keys = True))
+
+if __name__ == '__main__':
+    main()
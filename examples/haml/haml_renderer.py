@@ -1,11 +1,75 @@
 import contextlib
 import itertools
 import collections
+import functools
+import time
 from html import escape as escape_html
 
+class FragmentCache:
+    """
+    Bounded LRU cache of rendered fragments
+    
+    Entries are keyed by (site, key) where site identifies the
+    - cache block in the template and key is the user supplied key
+    Entries expire after @ttl seconds (never if None)
+    
+    Hits and misses are counted per site in .stats
+    
+    Any object with the same get/set methods can be used
+    in place of this by assigning Stack.fragment_cache
+    """
+    
+    def __init__(self, maxsize = 1024, ttl = None, clock = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.store = collections.OrderedDict()
+        self.stats = collections.defaultdict(collections.Counter)
+    
+    def get(self, site, key):
+        """
+        Returns the cached fragment or None
+        """
+        
+        entry = self.store.get((site, key))
+        if entry is not None:
+            expires, fragment = entry
+            if expires is None or expires > self.clock():
+                self.store.move_to_end((site, key))
+                self.stats[site]['hits'] += 1
+                return fragment
+            del self.store[(site, key)]
+        
+        self.stats[site]['misses'] += 1
+        return None
+    
+    def set(self, site, key, fragment, ttl = None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = None if ttl is None else self.clock() + ttl
+        
+        self.store[(site, key)] = (expires, fragment)
+        self.store.move_to_end((site, key))
+        while len(self.store) > self.maxsize:
+            self.store.popitem(last = False)
+    
+    def invalidate(self, key, site = None):
+        """
+        Drop all fragments cached under @key
+        (only those at @site if given)
+        """
+        
+        for k in [k for k in self.store if k[1] == key and site in (None, k[0])]:
+            del self.store[k]
+    
+    def clear(self):
+        self.store.clear()
+        self.stats.clear()
+
 class Stack:
     _indent = ' ' * 2
     VOID_ELEMENTS = {'meta', 'img', 'link', 'br', 'hr', 'input', 'area', 'param', 'col', 'base'}
+    fragment_cache = FragmentCache()
     
     def __init__(self):
         self.text = []
@@ -66,28 +130,80 @@ class Stack:
         self.indent -= 1
         self.text.append(self.indented('-->'))
     
-    def add_tag(self, name, text, classes, ids, attributes, void = False, escape = True, inline_text = False):
+    @classmethod
+    def serialize_attributes(cls, classes, ids, attributes):
         attributes = attributes or {}
         
-        cls = ' '.join(self.combine_attribute('class', classes, attributes))
-        if cls:
-            attributes['class'] = cls
-        id = '_'.join(self.combine_attribute('id', ids, attributes))
+        class_ = ' '.join(cls.combine_attribute('class', classes, attributes))
+        if class_:
+            attributes['class'] = class_
+        id = '_'.join(cls.combine_attribute('id', ids, attributes))
         if id:
             attributes['id'] = id
         
-        attributes_list = []
-        for k, v in attributes.items():
-            if v is False:
-                continue
-            elif v is True:
-                attributes_list.append(' {}'.format(k))
-            elif k == 'data' and isinstance(v, dict):
-                for suffix, value in v.items():
-                    attributes_list.append(' data-{}={!r}'.format(suffix.replace('_', '-'), escape_html(str(value))))
-            else:
-                attributes_list.append(' {}={!r}'.format(k, escape_html(str(v))))
-        attributes_string = ''.join(attributes_list)
+        return ''.join(cls.format_attribute(k)(v) for k, v in attributes.items())
+    
+    @staticmethod
+    @functools.lru_cache(maxsize = 256)
+    def format_attribute(key):
+        """
+        Returns a function that formats a value for attribute @key
+        
+        Bounded, as serialize_attributes() also asks for the keys of
+        dynamic attribute dicts, which can be made up of data
+        """
+        
+        prefix = ' {}='.format(key)
+        def format(value):
+            if value is False:
+                return ''
+            elif value is True:
+                return ' ' + key
+            elif key == 'data' and isinstance(value, dict):
+                return ''.join(' data-{}={!r}'.format(suffix.replace('_', '-'), escape_html(str(v))) for suffix, v in value.items())
+            return prefix + repr(escape_html(str(value)))
+        return format
+    
+    @classmethod
+    @functools.lru_cache(maxsize = None)
+    def compile_attributes(cls, keys, classes, ids):
+        """
+        Returns a specialised serializer for tags whose attribute
+        keys are known in advance; it takes the values of @keys
+        and returns the same string as serialize_attributes()
+        
+        The serializers are cached, so each tag site only builds one
+        """
+        
+        formatters = []
+        for key in keys:
+            format = cls.format_attribute(key)
+            if key in ('class', 'id'):
+                format = cls._combining_formatter(key, classes if key == 'class' else ids, format)
+            formatters.append(format)
+        
+        # static classes/ids without a matching key are appended as constants
+        suffix = cls.serialize_attributes(
+            () if 'class' in keys else classes,
+            () if 'id' in keys else ids,
+            None,
+        )
+        
+        def serialize(*values):
+            return ''.join([f(v) for f, v in zip(formatters, values)]) + suffix
+        return serialize
+    
+    @classmethod
+    def _combining_formatter(cls, key, static, format):
+        separator = ' ' if key == 'class' else '_'
+        def combine(value):
+            combined = separator.join(cls.combine_attribute(key, static, {key: value}))
+            return format(combined or value)
+        return combine
+    
+    def add_tag(self, name, text, classes, ids, attributes = None, void = False, escape = True, inline_text = False, attributes_string = None):
+        if attributes_string is None:
+            attributes_string = self.serialize_attributes(classes, ids, attributes)
         
         # place holder for open tag
         self.text.append(None)
@@ -123,6 +239,32 @@ class Stack:
         elif name not in self.VOID_ELEMENTS:
             self.text[index] = '{}{}'.format(open_tag, close_tag)
     
+    def cache_fragment(self, site, key = None, ttl = None):
+        """
+        Generator backing the - cache block
+        
+        Inserts the cached fragment if there is one, otherwise
+        yields once so the block body is rendered and then caches it
+        
+        Fragments are stored without the current indentation
+        so they can be reused at any depth
+        """
+        
+        prefix = self.indent * self._indent
+        fragment = self.fragment_cache.get(site, key)
+        if fragment is not None:
+            self.text.extend(self.indent_text(i) for i in fragment)
+            return
+        
+        index = len(self.text)
+        yield
+        
+        fragment = tuple(
+            ''.join(l[len(prefix):] if l.startswith(prefix) else l for l in i.splitlines(True))
+            for i in self.text[index:] if i is not None
+        )
+        self.fragment_cache.set(site, key, fragment, ttl)
+    
     def extend(self, stack):
         self.text.extend(self.indented(i) for i in stack.text)
     
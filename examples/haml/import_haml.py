@@ -6,22 +6,33 @@ Just do:
     import haml_module
     output = haml_module.render(text = 'Some text', title = 'The Title', **other_variables)
     print(output)
+
+Expensive fragments can be cached with:
+    - cache key, ttl = 60:
+        %p rendered once per key
+See haml_renderer.FragmentCache
 """
 
 import import_anything
-from import_anything import utils
+from import_anything import passes, utils
+import ast
 import itertools
 import re
 import tokenize
 from .haml_renderer import Stack
 
 class HamlCompiler(import_anything.Compiler):
-    MAGIC = 53
+    MAGIC = 57
     MAGIC_TAG = 'haml'
+    # HoistAttributes(['__stack']) would be safe, but doesn't speed up
+    # rendering on python 3.11+ (LOAD_GLOBAL and LOAD_METHOD are cached)
+    passes = (passes.FoldStrings, passes.RemoveDeadBranches)
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        print(self.get_source(original_numbers = True))
+    TAG_RE = re.compile(r'([\w.#-]*)(.*)')
+    CLASS_ID_RE = re.compile(r'([#.])')
+    CODE_RE = re.compile(r'[=-]|([&!]=)')
+    # '- cache:' or '- cache key, ttl = 60:', not python such as '- cache.items():'
+    CACHE_RE = re.compile(r'cache(?:\s+(.*?))?\s*:\s*$', re.S)
     
     def parse_html_attributes(self, string):
         """
@@ -51,6 +62,28 @@ class HamlCompiler(import_anything.Compiler):
             
             yield key, value
     
+    def static_attributes(self, attributes):
+        """
+        If all the attribute dicts are literals with constant (and distinct)
+        string keys, returns a dict of key: value source
+        Otherwise returns None
+        """
+        
+        static = {}
+        for a in attributes:
+            try:
+                node = ast.parse(a, mode = 'eval').body
+            except SyntaxError:
+                return None
+            if not isinstance(node, ast.Dict):
+                return None
+            
+            for k, v in zip(node.keys, node.values):
+                if not (isinstance(k, ast.Constant) and isinstance(k.value, str)) or k.value in static:
+                    return None
+                static[k.value] = ast.get_source_segment(a, v)
+        return static
+    
     @utils.complete_blocks()
     def translate(self, file, block):
         """
@@ -89,12 +122,12 @@ class HamlCompiler(import_anything.Compiler):
                 if line.startswith('%'):
                     line = line[1:]
                 
-                tag, string = re.match(r'([\w.#-]*)(.*)', line.lstrip()).groups()
+                tag, string = self.TAG_RE.match(line.lstrip()).groups()
                 
                 # extract the .class#id
                 classes = []
                 ids = []
-                tag, *rest = re.split(r'([#.])', tag)
+                tag, *rest = self.CLASS_ID_RE.split(tag)
                 for prefix, name in zip(rest[::2], rest[1::2]):
                     if prefix == '.':
                         classes.append(name)
@@ -118,12 +151,23 @@ class HamlCompiler(import_anything.Compiler):
                     attributes.append(attrs)
                 
                 # assign all the attributes
-                if attributes:
+                static = self.static_attributes(attributes)
+                if static is not None:
+                    # keys are known, so use a precompiled serializer
+                    serializer = (tuple(static), tuple(classes), tuple(ids))
+                    if static:
+                        attributes_string = '__stack.compile_attributes{!r}({})'.format(
+                            serializer,
+                            ', '.join('({})'.format(v) for v in static.values()),
+                        )
+                    else:
+                        # nothing dynamic, so serialize it now
+                        attributes_string = repr(Stack.compile_attributes(*serializer)())
+                else:
+                    # static_attributes() handles no attributes
                     yield lineno, utils.indent(indent, '__attributes = {}')
                     for a in attributes:
                         yield lineno, utils.indent(indent, '__attributes.update({})', a)
-                else:
-                    yield lineno, utils.indent(indent, '__attributes = None')
                 
                 # void tag
                 void = False
@@ -145,17 +189,23 @@ class HamlCompiler(import_anything.Compiler):
                     inline_text = bool(string)
                     string = repr(string)
                 
+                if static is not None:
+                    attributes_arg = 'attributes_string = ' + attributes_string
+                else:
+                    attributes_arg = 'attributes = __attributes'
+                
                 if void or inline_text:
-                    template = '__stack.add_tag({tag!r}, {text}, {classes!r}, {ids!r}, void = {void!r}, attributes = __attributes, escape = {escape}, inline_text = {inline_text!r})'
+                    template = '__stack.add_tag({tag!r}, {text}, {classes!r}, {ids!r}, void = {void!r}, {attributes_arg}, escape = {escape}, inline_text = {inline_text!r})'
                 
                 else:
-                    template = 'with __stack.add_tag_context({tag!r}, {text}, {classes!r}, {ids!r}, attributes = __attributes, escape = {escape}):'
+                    template = 'with __stack.add_tag_context({tag!r}, {text}, {classes!r}, {ids!r}, {attributes_arg}, escape = {escape}):'
                 
                 line = utils.indent(indent, template,
                     tag = tag,
                     text = string,
                     classes = tuple(classes),
                     ids = tuple(ids),
+                    attributes_arg = attributes_arg,
                     void = void,
                     escape = escape,
                     inline_text = inline_text,
@@ -177,7 +227,7 @@ class HamlCompiler(import_anything.Compiler):
                 pass
             
             else:
-                match = re.match(r'[=-]|([&!]=)', line)
+                match = self.CODE_RE.match(line)
                 if match:
                     lineno = self.lineno
                     initial = match.group(0)
@@ -185,7 +235,12 @@ class HamlCompiler(import_anything.Compiler):
                     gen = itertools.chain([line[match.end(0):].lstrip() + '\n'], _lines)
                     line = ''.join(self.get_multiline(gen))
                     
-                    if initial == '=':
+                    cache = self.CACHE_RE.match(line)
+                    if initial == '-' and cache:
+                        # cached fragment; the body is only run on a miss
+                        args = (cache.group(1) or '').strip()
+                        yield lineno, block(utils.indent(indent, 'for __fragment in __stack.cache_fragment((__name__, {}){}):', lineno, ', ' + args if args else ''))
+                    elif initial == '=':
                         yield lineno, utils.indent(indent, '__stack.add_text({})', line)
                     elif initial == '&=':
                         yield lineno, utils.indent(indent, '__stack.add_text({}, escape = True)', line)
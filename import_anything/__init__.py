@@ -1,3 +1,24 @@
-from .compiler import Compiler
 from .loader import Loader
 from .finder import Finder
+
+# only needed to compile or reload, which a process running
+# from cached bytecode may never do, so imported on first use
+_lazy = {
+    'Compiler': 'compiler',
+    'Reloader': 'reloader',
+    'dependents_of': 'dependencies',
+    'preload': 'preloader',
+    'DirectoryStore': 'store',
+}
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    
+    import importlib
+    value = getattr(importlib.import_module('.' + _lazy[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
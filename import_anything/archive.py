@@ -0,0 +1,149 @@
+import importlib.machinery
+import importlib.util
+import os
+import time
+# zipfile is slow to import and only needed once there is an archive,
+# so it is imported where it is used
+
+class Archive:
+    """
+    Archive
+
+    A zip archive (zipapp, wheel etc.) on sys.path
+
+    The central directory is read once when the archive is opened;
+    archives are cached by path and reopened if the file changes (the
+    old one is closed then, so its loaders can't read the new file
+    through the old index). Paths inside an archive look like
+    /path/to/archive.zip/pkg/module.ext
+    """
+
+    _archives = {}
+    _entries = {}
+
+    def __init__(self, path):
+        import zipfile
+
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        self.zipfile = zipfile.ZipFile(path)
+        self.names = {i.filename: i for i in self.zipfile.infolist()}
+
+        # not all archives have entries for directories
+        self.directories = set()
+        for name in self.names:
+            parts = name.split('/')[:-1]
+            for i in range(1, len(parts) + 1):
+                self.directories.add('/'.join(parts[:i]) + '/')
+
+    @classmethod
+    def find(cls, entry):
+        """
+        Returns (archive, prefix) if the sys.path @entry is inside a
+        zip archive, where prefix is the directory inside the archive.
+        Otherwise returns None
+        """
+
+        try:
+            location = cls._entries[entry]
+        except KeyError:
+            location = cls._entries[entry] = cls._locate(entry)
+
+        if location is None:
+            return None
+
+        import zipfile
+
+        path, prefix = location
+        archive = cls._archives.get(path)
+        try:
+            if archive is None or os.stat(path).st_mtime != archive.mtime:
+                if archive is not None:
+                    del cls._archives[path]
+                    archive.close()
+                archive = cls._archives[path] = cls(path)
+        except (OSError, zipfile.BadZipFile):
+            return None
+        return archive, prefix
+
+    @staticmethod
+    def _locate(entry):
+        if not entry or os.path.isdir(entry):
+            return None
+
+        path = entry
+        prefix = []
+        while path:
+            if os.path.isfile(path):
+                import zipfile
+                if not zipfile.is_zipfile(path):
+                    return None
+                prefix = '/'.join(reversed(prefix))
+                return path, prefix + '/' if prefix else ''
+
+            head, tail = os.path.split(path)
+            if head == path:
+                return None
+            prefix.append(tail)
+            path = head
+        return None
+
+    @classmethod
+    def invalidate_caches(cls):
+        cls._archives.clear()
+        cls._entries.clear()
+
+    def find_spec(self, fullname, prefix, details):
+        """
+        Like FileFinder.find_spec(), returns a spec for @fullname
+        in the archive under @prefix, a namespace portion spec
+        (no loader) or None
+        @details are (loader, suffixes) as for FileFinder
+        """
+
+        tail = fullname.rpartition('.')[2]
+        for candidate in (tail + '/__init__', tail):
+            for loader, suffixes in details:
+                for suffix in suffixes:
+                    member = prefix + candidate + suffix
+                    if member in self.names:
+                        path = os.path.join(self.path, *member.split('/'))
+                        loader = loader(fullname, path, archive = self)
+                        return importlib.util.spec_from_file_location(fullname, path, loader = loader)
+
+        if prefix + tail + '/' in self.directories:
+            spec = importlib.machinery.ModuleSpec(fullname, None)
+            spec.submodule_search_locations = [os.path.join(self.path, *(prefix + tail).split('/'))]
+            return spec
+        return None
+
+    def member(self, path):
+        """
+        Returns the name inside the archive of @path
+        Raises OSError if it is not in the archive
+        """
+
+        if not path.startswith(self.path + os.sep):
+            raise FileNotFoundError(path)
+        member = path[len(self.path) + 1:].replace(os.sep, '/')
+        if member not in self.names:
+            raise FileNotFoundError(path)
+        return member
+
+    def close(self):
+        self.zipfile.close()
+
+    def read(self, path):
+        member = self.member(path)
+        if self.zipfile.fp is None:
+            raise OSError('{} has changed since it was opened'.format(self.path))
+        return self.zipfile.read(member)
+
+    def stat(self, path):
+        """
+        Returns the mtime and size of @path like Loader.path_stats
+        """
+
+        info = self.names[self.member(path)]
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        return {'mtime': mtime, 'size': info.file_size}
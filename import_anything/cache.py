@@ -0,0 +1,248 @@
+"""
+Finds and cleans up the tagged bytecode written for custom modules
+
+    python -m import_anything.cache [--import module] [--delete] [path ...]
+
+Bumping a compiler's MAGIC or upgrading python leaves the old
+*.{MAGIC_TAG}.pyc files behind, as does deleting or renaming sources.
+Only the tags of registered compilers are known, so --import the
+modules that register them first
+
+Bytecode kept in a central directory (Loader's cache_dir or
+sys.pycache_prefix) is found with --cache-dir
+"""
+
+import argparse
+import concurrent.futures
+import importlib
+import importlib.util
+import json
+import os
+import sys
+
+from .finder import Finder
+from .loader import HEADER_SIZE
+
+CURRENT = 'current'
+STALE_MAGIC = 'stale-magic'
+ORPHANED = 'orphaned'
+WRONG_VERSION = 'wrong-version'
+STATUSES = (CURRENT, STALE_MAGIC, ORPHANED, WRONG_VERSION)
+
+def tagged_loaders():
+    """
+    Returns { MAGIC_TAG: [(suffix, loader factory)] } of the
+    registered loaders whose compilers have a MAGIC_TAG
+    """
+
+    loaders = {}
+    for suffix, (priority, loader) in sorted(Finder._registry.items()):
+        compiler = getattr(loader, 'keywords', {}).get('compiler')
+        tag = getattr(compiler, 'MAGIC_TAG', None)
+        if tag is not None:
+            loaders.setdefault(tag, []).append((suffix, loader))
+    return loaders
+
+def parse(filename, tags):
+    """
+    Returns (module name, cache tag, MAGIC_TAG) for a tagged
+    bytecode @filename with one of @tags, or None
+
+    'module.cpython-311.opt-1.tag.pyc' -> ('module', 'cpython-311', 'tag')
+    """
+
+    if not filename.endswith('.pyc'):
+        return None
+    stem = filename[:-len('.pyc')]
+    for tag in tags:
+        if not stem.endswith('.' + tag):
+            continue
+        parts = stem[:-len(tag) - 1].split('.')
+        if parts[-1].startswith('opt-'):
+            parts.pop()
+        if len(parts) >= 2 and all(parts):
+            return '.'.join(parts[:-1]), parts[-1], tag
+    return None
+
+def classify(path, loaders, source_directory = None):
+    """
+    Returns the status of the tagged bytecode at @path, for a source in
+    @source_directory (by default the parent of its __pycache__):
+        CURRENT         for the installed compiler and python
+        ORPHANED        its source is gone
+        WRONG_VERSION   written by another python version
+        STALE_MAGIC     written by another version of the compiler
+    or None if it isn't tagged bytecode of one of @loaders
+    (see tagged_loaders())
+
+    Bytecode that is only older than its source isn't stale,
+    it is rewritten in place on the next import
+    """
+
+    directory, filename = os.path.split(path)
+    parsed = parse(filename, loaders)
+    if parsed is None:
+        return None
+    name, cache_tag, tag = parsed
+
+    if source_directory is None:
+        if os.path.basename(directory) != '__pycache__':
+            return None
+        source_directory = os.path.dirname(directory)
+    for suffix, loader in loaders[tag]:
+        source = os.path.join(source_directory, name + suffix)
+        if os.path.isfile(source):
+            break
+    else:
+        return ORPHANED
+
+    if cache_tag != sys.implementation.cache_tag:
+        return WRONG_VERSION
+
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+    except OSError:
+        return None
+    magic = loader(name, source).apply_compiler_magic(header[:4])
+    return CURRENT if magic == importlib.util.MAGIC_NUMBER else STALE_MAGIC
+
+def find(paths, cache_dir = None):
+    """
+    Yields (path, source directory) for every bytecode file in the
+    __pycache__ directories under @paths, or if @cache_dir is set,
+    for every one under @cache_dir belonging to a source under @paths
+    """
+
+    if cache_dir is None:
+        for path in paths:
+            for directory, subdirectories, files in os.walk(path):
+                if os.path.basename(directory) == '__pycache__':
+                    for filename in files:
+                        if filename.endswith('.pyc'):
+                            yield os.path.join(directory, filename), os.path.dirname(directory)
+        return
+
+    # the source directories are mirrored under cache_dir (see Loader)
+    for path in paths:
+        mirrored = os.path.splitdrive(os.path.abspath(path))[1].lstrip(os.sep)
+        for directory, subdirectories, files in os.walk(os.path.join(cache_dir, mirrored)):
+            source_directory = os.path.join(os.sep, os.path.relpath(directory, cache_dir))
+            for filename in files:
+                if filename.endswith('.pyc'):
+                    yield os.path.join(directory, filename), os.path.normpath(source_directory)
+
+def scan(paths, workers = None, cache_dir = None):
+    """
+    Returns [(path, status, size, source directory)] for the tagged
+    bytecode of the registered compilers under @paths (see find()),
+    classified by @workers threads
+    """
+
+    loaders = tagged_loaders()
+    if not loaders:
+        return []
+
+    def entry(found):
+        path, source_directory = found
+        status = classify(path, loaders, source_directory)
+        try:
+            return path, status, os.path.getsize(path), source_directory
+        except OSError:
+            return path, None, 0, source_directory
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        return [e for e in executor.map(entry, find(paths, cache_dir)) if e[1] is not None]
+
+def delete(entries, statuses = (STALE_MAGIC, ORPHANED, WRONG_VERSION), workers = None):
+    """
+    Deletes the bytecode of @entries (from scan()) with one of
+    @statuses, using @workers threads
+
+    Each file is classified again first, so bytecode rewritten
+    (or a source added) since the scan is kept
+    Returns the entries of the deleted files
+    """
+
+    loaders = tagged_loaders()
+
+    def remove(entry):
+        path, status, size, source_directory = entry
+        if status not in statuses or classify(path, loaders, source_directory) != status:
+            return None
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return None
+        return entry
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        return [e for e in executor.map(remove, entries) if e is not None]
+
+def summarise(entries):
+    """
+    Returns { status: {'files': count, 'bytes': total size} }
+    """
+
+    summary = {status: {'files': 0, 'bytes': 0} for status in STATUSES}
+    for path, status, size, source_directory in entries:
+        summary[status]['files'] += 1
+        summary[status]['bytes'] += size
+    return summary
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        prog = 'python -m import_anything.cache',
+        description = 'Report and delete stale tagged bytecode of custom modules',
+    )
+    parser.add_argument('paths', nargs = '*', default = [os.curdir],
+        help = 'directories to search (default: the current directory)')
+    parser.add_argument('-c', '--cache-dir',
+        help = 'directory the bytecode is kept in instead of __pycache__ (the cache_dir or sys.pycache_prefix)')
+    parser.add_argument('-i', '--import', dest = 'modules', action = 'append', default = [],
+        help = 'module that registers a compiler, may be repeated')
+    parser.add_argument('-d', '--delete', action = 'store_true',
+        help = 'delete stale bytecode')
+    parser.add_argument('--keep-other-versions', action = 'store_true',
+        help = "don't delete the bytecode of other python versions")
+    parser.add_argument('-j', '--workers', type = int,
+        help = 'number of threads')
+    parser.add_argument('-v', '--verbose', action = 'store_true',
+        help = 'list every file')
+    parser.add_argument('--json', action = 'store_true',
+        help = 'print the results as JSON')
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        importlib.import_module(module)
+    if not tagged_loaders():
+        parser.error('no compilers with a MAGIC_TAG are registered, --import the module that registers one')
+
+    entries = scan(args.paths, args.workers, args.cache_dir)
+    result = {'scanned': summarise(entries)}
+    if args.delete:
+        statuses = (STALE_MAGIC, ORPHANED) if args.keep_other_versions else (STALE_MAGIC, ORPHANED, WRONG_VERSION)
+        deleted = delete(entries, statuses, args.workers)
+        result['deleted'] = summarise(deleted)
+        deleted = {entry[0] for entry in deleted}
+    else:
+        deleted = set()
+
+    if args.json:
+        if args.verbose:
+            result['files'] = [{'path': p, 'status': s, 'bytes': n, 'deleted': p in deleted} for p, s, n, d in entries]
+        json.dump(result, sys.stdout, indent = 4)
+        print()
+        return 0
+
+    if args.verbose:
+        for path, status, size, source_directory in sorted(entries):
+            print('{:<14} {:>10} {}{}'.format(status, size, path, ' (deleted)' if path in deleted else ''))
+    for heading, summary in result.items():
+        print('{}:'.format(heading))
+        for status, totals in summary.items():
+            print('    {:<14} {files:>6} files {bytes:>12} bytes'.format(status, **totals))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
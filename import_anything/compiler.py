@@ -1,8 +1,14 @@
 import ast
+import copy
 import re
 import io
+import os
 import linecache
+import sys
 import tokenize
+import types
+
+from .utils import encode_locations
 
 class Compiler:
     """
@@ -22,33 +28,107 @@ class Compiler:
     It should be a 16-bit unsigned integer (max 65535).
     
     In general, you should use both MAGIC and MAGIC_TAG.
+    
+    .translate may also yield ast.stmt nodes instead of lines of python,
+    with their line numbers already pointing to the original source
+    and col_offset giving their indentation. If every statement is a
+    node, no python is parsed at all.
+    
+    If dump_dir is set (defaults to $IMPORT_ANYTHING_DUMP_DIR),
+    the translated source of each file is written into it.
+    Override .dump() to send it elsewhere.
+    
+    .passes transform the AST before it is compiled, e.g.
+        passes = (passes.FoldStrings, functools.partial(passes.HoistAttributes, ['x']))
+    Their output is in the cached bytecode, so bump MAGIC when
+    changing them.
+    
+    .make_code() compiles the translated source. With remap_code
+    (python 3.11+) and no .passes, the source is compiled as is and
+    the line numbers are fixed in the code objects afterwards,
+    otherwise they are fixed in the AST (see .make_ast_tree())
     """
     
     MAGIC = None
     MAGIC_TAG = None
+    # ast.NodeTransformer factories, see .make_ast_tree()
+    passes = ()
+    # { line in .data: ast.stmt yielded by .translate }, per instance;
+    # read-only here so it can't be filled for every compiler at once
+    nodes = types.MappingProxyType({})
+    dump_dir = os.environ.get('IMPORT_ANYTHING_DUMP_DIR')
+    remap_code = sys.version_info >= (3, 11)
     
-    def __init__(self, file):
+    def __init__(self, file = None, path = None):
         """
         Performs the translation on __init__
         
         @file:      either the path to a file to translate or a file-like
-                    object, in which case the will be '<string>'
+                    object, in which case the path will be @path
+                    or '<string>'
+                    If None, nothing is translated until .load()
+        """
+        
+        self.nodes = {}
+        if file is not None:
+            self.load(file, path)
+    
+    def load(self, file, path = None):
+        """
+        Translate @file (see __init__), replacing any previous translation
         """
         
         if isinstance(file, str):
             self.path = file
             file = self.open(self.path)
         else:
-            self.path = '<string>'
+            self.path = path or '<string>'
         
         lines = []
+        self.nodes = {}
         self.line_numbers = [0]
         for lineno, line in self.translate(file):
+            if isinstance(line, ast.stmt):
+                # a placeholder, swapped for the node after parsing
+                self.nodes[len(lines) + 1] = self.fill_locations(line, lineno)
+                line = ' ' * line.col_offset + 'pass'
+            
             for i, l in enumerate(line.split('\n'), lineno):
                 self.line_numbers.append(i)
                 lines.append(l)
         
         self.data = '\n'.join(lines)
+        
+        if self.dump_dir is not None:
+            self.dump()
+    
+    @classmethod
+    def translate_many(cls, files):
+        """
+        Translate each of @files (paths or file-like objects) reusing
+        a single compiler, so any setup in __init__ is done once
+        
+        Yields a compiler per file as soon as it is translated
+        """
+        
+        compiler = cls()
+        for file in files:
+            compiler.load(file)
+            yield copy.copy(compiler)
+    
+    def dump(self):
+        """
+        Write the translated source (with original line numbers)
+        to a file in .dump_dir named after the source path
+        """
+        
+        if self.path == '<string>':
+            return
+        
+        name = os.path.abspath(self.path).lstrip(os.sep).replace(os.sep, '.') + '.py'
+        os.makedirs(self.dump_dir, exist_ok = True)
+        with open(os.path.join(self.dump_dir, name), 'w') as file:
+            file.writelines(line + '\n' for line in self.iter_source(original_numbers = True))
     
     def open(self, path):
         """
@@ -60,9 +140,26 @@ class Compiler:
     @classmethod
     def eval(cls, string):
         compiled = cls(io.StringIO(string))
-        tree = compiled.make_ast_tree()
-        code = compile(tree, compiled.path, 'exec')
-        return eval(code)
+        return eval(compiled.make_code())
+    
+    @staticmethod
+    def fill_locations(node, lineno):
+        """
+        Give @node and its children line @lineno (and column 0)
+        where they have no location, like ast.fix_missing_locations
+        """
+        
+        for child in ast.walk(node):
+            if 'lineno' in child._attributes:
+                if getattr(child, 'lineno', None) is None:
+                    child.lineno = lineno
+                if getattr(child, 'col_offset', None) is None:
+                    child.col_offset = 0
+                if getattr(child, 'end_lineno', None) is None:
+                    child.end_lineno = child.lineno
+                if getattr(child, 'end_col_offset', None) is None:
+                    child.end_col_offset = child.col_offset
+        return node
     
     def make_ast_tree(self):
         """
@@ -70,27 +167,129 @@ class Compiler:
         
         All it does is modify the line numbers
         so that tracebacks work nicely
+        and put in any nodes yielded by .translate
+        
+        Then each of .passes is called for an ast.NodeTransformer
+        to visit the tree (see import_anything.passes)
         """
         
         line_numbers = self.line_numbers
+        nodes = self.nodes
+        
+        if nodes and len(nodes) == len(line_numbers) - 1 and not any(n.col_offset for n in nodes.values()):
+            # nothing but nodes, no need to parse
+            tree = ast.Module(body = list(nodes.values()), type_ignores = [])
+        else:
+            try:
+                tree = ast.parse(self.data, filename = self.path)
+            except SyntaxError as e:
+                self.remap_error(e)
+                raise
+            
+            self.remap(tree)
+        
+        for factory in self.passes:
+            tree = factory().visit(tree)
+        return tree
+    
+    def make_code(self, path = None, *args, **kwargs):
+        """
+        Returns the code object for the translated source
+        @args and @kwargs are passed on to compile()
+        """
+        
+        path = path or self.path
+        if not self.remap_code or self.nodes or self.passes:
+            return compile(self.make_ast_tree(), path, 'exec', *args, **kwargs)
         
         try:
-            tree = ast.parse(self.data, filename = self.path)
+            code = compile(self.data, path, 'exec', *args, **kwargs)
         except SyntaxError as e:
-            descr, args = e.args
-            args = list(args)
-            args[1] = line_numbers[e.lineno]
-            args[2] = None
-            args[3] = linecache.getline(e.filename, args[1]).strip('\n')
-            e.__init__(descr, args)
+            self.remap_error(e)
             raise
+        return self.remap_code_object(code)
+    
+    def remap_code_object(self, code):
+        """
+        Returns @code (and the code objects in its co_consts)
+        with line numbers pointing to the original source
+        """
         
-        for node in ast.walk(tree):
+        line_numbers = self.line_numbers
+        positions = []
+        for lineno, end_lineno, col, end_col in code.co_positions():
+            if not lineno:
+                # no location or an artificial one (line 0)
+                positions.append((lineno, end_lineno, col, end_col))
+                continue
+            
+            lineno = line_numbers[lineno]
+            if end_lineno is not None:
+                end_lineno = line_numbers[end_lineno]
+                # same as .remap()
+                if end_lineno <= lineno:
+                    end_lineno = lineno
+                    if col is not None and end_col is not None:
+                        end_col = max(col, end_col)
+            positions.append((lineno, end_lineno, col, end_col))
+        
+        # modules always start at line 1
+        firstlineno = code.co_firstlineno if code.co_name == '<module>' else line_numbers[code.co_firstlineno] or 1
+        consts = tuple(self.remap_code_object(c) if isinstance(c, types.CodeType) else c for c in code.co_consts)
+        return code.replace(
+            co_firstlineno = firstlineno,
+            co_linetable = encode_locations(positions, firstlineno),
+            co_consts = consts,
+        )
+    
+    def remap_error(self, e):
+        """
+        Point the SyntaxError @e at the original source
+        """
+        
+        descr, args = e.args
+        # drop the end position (3.10+), it can't be mapped
+        args = list(args[:4])
+        args[1] = self.line_numbers[e.lineno]
+        args[2] = None
+        args[3] = linecache.getline(e.filename, args[1]).strip('\n')
+        e.__init__(descr, args)
+    
+    def remap(self, tree):
+        """
+        Point the line numbers in @tree to the original source
+        and swap placeholder statements for .nodes, which already do
+        """
+        
+        line_numbers = self.line_numbers
+        nodes = self.nodes
+        
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    for i, child in enumerate(value):
+                        if not isinstance(child, ast.AST):
+                            continue
+                        # placeholders still have their translated line number
+                        if nodes and type(child) is ast.Pass and child.lineno in nodes:
+                            value[i] = nodes[child.lineno]
+                        else:
+                            stack.append(child)
+                elif isinstance(value, ast.AST):
+                    stack.append(value)
+            
             try:
                 node.lineno = line_numbers[node.lineno]
-            except AttributeError:
+                node.end_lineno = line_numbers[node.end_lineno]
+                if node.end_lineno <= node.lineno:
+                    # several lines may translate one line
+                    node.end_lineno = node.lineno
+                    node.end_col_offset = max(node.col_offset, node.end_col_offset)
+            except (AttributeError, TypeError):
                 pass
-        return tree
     
     def get_source(self, line_numbers = True, original_numbers = False):
         """
@@ -100,7 +299,13 @@ class Compiler:
         source file are used
         """
         
-        source = []
+        return '\n'.join(self.iter_source(line_numbers, original_numbers))
+    
+    def iter_source(self, line_numbers = True, original_numbers = False):
+        """
+        Same as .get_source() but yields it line by line
+        """
+        
         data = self.data.split('\n')
         
         if original_numbers:
@@ -116,10 +321,11 @@ class Compiler:
             template = '{line}'
             number_width = 0
         
-        for lineno, line in data:
+        for i, (lineno, line) in enumerate(data, 1):
+            if i in self.nodes:
+                line = line[:-len('pass')] + ast.unparse(self.nodes[i])
             lineno = str(lineno).rjust(number_width)
-            source.append(template.format(lineno = lineno, line = line) )
-        return '\n'.join(source)
+            yield template.format(lineno = lineno, line = line)
     
     def translate(self, file):
         """
@@ -127,7 +333,7 @@ class Compiler:
         
         Yields ( line number, line ), where:
             line number refers to the original/untranslated source
-            line is the translated python string
+            line is the translated python string or an ast.stmt
         """
         
         for lineno, line in enumerate(file, 1):
@@ -0,0 +1,118 @@
+import importlib.util
+import opcode
+import types
+
+# the dis module is slow to import, the bytecode is simple enough to read
+IMPORT_NAME = opcode.opmap['IMPORT_NAME']
+LOAD_CONST = opcode.opmap['LOAD_CONST']
+LOAD_SMALL_INT = opcode.opmap.get('LOAD_SMALL_INT')
+# inline caches (3.11+)
+CACHE = opcode.opmap.get('CACHE')
+
+def instructions(code):
+    """
+    Yields ( opcode, argument ) for each instruction in @code,
+    with EXTENDED_ARGs applied and inline caches skipped
+    """
+
+    raw = code.co_code
+    extended = 0
+    for i in range(0, len(raw), 2):
+        op, arg = raw[i], raw[i + 1] | extended
+        if op == opcode.EXTENDED_ARG:
+            extended = arg << 8
+            continue
+        extended = 0
+        if op != CACHE:
+            yield op, arg
+
+class Dependencies:
+    """
+    Dependencies
+
+    Graph of static imports between custom modules
+
+    Imports are read from the IMPORT_NAME instructions in a module's
+    code object (including nested functions), so they are available
+    from cached bytecode without re-translating the source
+    """
+
+    def __init__(self):
+        self.imports = {}
+
+    @staticmethod
+    def find_imports(code, package = None):
+        """
+        Returns the set of module names imported anywhere in @code
+
+        Relative imports are resolved against @package
+        For 'from x import y', both x and x.y are included
+        since y may be a submodule
+        """
+
+        names = set()
+        stack = [code]
+        while stack:
+            code = stack.pop()
+            stack.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+
+            # skip code without imports
+            if IMPORT_NAME not in code.co_code[::2]:
+                continue
+
+            args = []
+            for op, arg in instructions(code):
+                if op == IMPORT_NAME and len(args) >= 2:
+                    level, fromlist = args[-2:]
+                    try:
+                        name = importlib.util.resolve_name('.' * (level or 0) + code.co_names[arg], package)
+                    except (ImportError, ValueError):
+                        continue
+
+                    if name:
+                        names.add(name)
+                    for item in fromlist or ():
+                        if item != '*':
+                            names.add('{}.{}'.format(name, item) if name else item)
+
+                if op == LOAD_CONST:
+                    args.append(code.co_consts[arg])
+                elif op == LOAD_SMALL_INT:
+                    args.append(arg)
+                else:
+                    args.clear()
+        return names
+
+    def record(self, name, code, package = None):
+        """
+        Record the imports of module @name from its @code
+        This replaces anything previously recorded for @name
+        """
+
+        self.imports[name] = self.find_imports(code, package)
+
+    def forget(self, name):
+        self.imports.pop(name, None)
+
+    def dependents_of(self, module, transitive = True):
+        """
+        Returns the names of the recorded modules that import @module
+        (a module or its name), and if @transitive, the modules that
+        import those and so on
+        """
+
+        name = getattr(module, '__name__', module)
+        dependents = set()
+        pending = [name]
+        while pending:
+            target = pending.pop()
+            for importer, imports in list(self.imports.items()):
+                if target in imports and importer not in dependents and importer != name:
+                    dependents.add(importer)
+                    if transitive:
+                        pending.append(importer)
+        return dependents
+
+# the graph recorded by Loader
+dependencies = Dependencies()
+dependents_of = dependencies.dependents_of
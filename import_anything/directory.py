@@ -0,0 +1,148 @@
+import importlib.machinery
+import importlib.util
+import os
+
+class Directory:
+    """
+    Directory
+
+    Finds modules in a directory on sys.path, like FileFinder
+
+    FileFinder tries each suffix in turn for every lookup, so lookups get
+    slower with every loader registered. Instead the directory listing
+    is indexed by module name once (and again whenever the directory
+    changes), so a lookup is a dict lookup however many suffixes there are
+    """
+
+    def __init__(self, path, details):
+        """
+        @path:          the directory
+        @details:       [(loader, suffixes)] as for FileFinder,
+                        earlier suffixes win over later ones
+        """
+
+        self.path = path
+        # suffix: (rank, loader)
+        self.suffixes = {}
+        for loader, suffixes in details:
+            for suffix in suffixes:
+                self.suffixes.setdefault(suffix, (len(self.suffixes), loader))
+        # suffixes that can't be found by splitting at a '.'
+        self.undotted = [s for s in self.suffixes if not s.startswith('.')]
+
+        self.mtime = None
+        # module name: (rank, filename, loader)
+        self.modules = {}
+        self.directories = set()
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.path)
+
+    def invalidate_caches(self):
+        self.mtime = None
+
+    def match(self, filename):
+        """
+        Returns (name, rank, loader) for the best suffix
+        @filename ends with, or None
+        """
+
+        best = None
+        i = filename.find('.', 1)
+        while i != -1:
+            found = self.suffixes.get(filename[i:])
+            if found is not None and (best is None or found[0] < best[1]):
+                best = (filename[:i], found[0], found[1])
+            i = filename.find('.', i + 1)
+
+        for suffix in self.undotted:
+            if filename.endswith(suffix) and len(filename) > len(suffix):
+                rank, loader = self.suffixes[suffix]
+                if best is None or rank < best[1]:
+                    best = (filename[:-len(suffix)], rank, loader)
+        return best
+
+    def refresh(self):
+        """
+        Index the directory listing if the directory has changed
+        """
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = -1
+        if mtime == self.mtime:
+            return
+
+        modules = {}
+        directories = set()
+        try:
+            entries = list(os.scandir(self.path))
+        except OSError:
+            entries = []
+
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    directories.add(entry.name)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+
+            found = self.match(entry.name)
+            if found is not None:
+                name, rank, loader = found
+                current = modules.get(name)
+                if current is None or rank < current[0]:
+                    modules[name] = (rank, entry.name, loader)
+
+        self.modules = modules
+        self.directories = directories
+        self.mtime = mtime
+
+    def find_spec(self, fullname, target = None):
+        """
+        Returns the spec of @fullname in the directory, a namespace
+        portion spec (no loader) or None. As for FileFinder, a package
+        wins over a module with the same name, which wins over a
+        namespace portion
+        """
+
+        self.refresh()
+        tail = fullname.rpartition('.')[2]
+
+        portion = None
+        if tail in self.directories:
+            portion = os.path.join(self.path, tail)
+            try:
+                filenames = os.listdir(portion)
+            except OSError:
+                filenames = []
+
+            best = None
+            for filename in filenames:
+                if filename.startswith('__init__'):
+                    found = self.match(filename)
+                    if found is not None and found[0] == '__init__' and (best is None or found[1] < best[1]):
+                        best = (filename, found[1], found[2])
+            if best is not None and os.path.isfile(os.path.join(portion, best[0])):
+                return self.spec(fullname, os.path.join(portion, best[0]), best[2], [portion])
+
+        module = self.modules.get(tail)
+        if module is not None:
+            rank, filename, loader = module
+            return self.spec(fullname, os.path.join(self.path, filename), loader)
+
+        if portion is not None:
+            spec = importlib.machinery.ModuleSpec(fullname, None)
+            spec.submodule_search_locations = [portion]
+            return spec
+        return None
+
+    @staticmethod
+    def spec(fullname, path, loader, submodule_search_locations = None):
+        loader = loader(fullname, path)
+        return importlib.util.spec_from_file_location(fullname, path, loader = loader,
+            submodule_search_locations = submodule_search_locations)
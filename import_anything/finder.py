@@ -1,6 +1,19 @@
 import importlib.machinery
-import importlib.util
+import os
 import sys
+import threading
+import zipimport
+
+from .archive import Archive
+from .directory import Directory
+from .loader import Loader
+
+# the stdlib's own loaders, as FileFinder uses them
+STANDARD_DETAILS = [
+    (importlib.machinery.ExtensionFileLoader, importlib.machinery.EXTENSION_SUFFIXES),
+    (importlib.machinery.SourceFileLoader, importlib.machinery.SOURCE_SUFFIXES),
+    (importlib.machinery.SourcelessFileLoader, importlib.machinery.BYTECODE_SUFFIXES),
+]
 
 class Finder(importlib.machinery.PathFinder):
     """
@@ -8,38 +21,300 @@ class Finder(importlib.machinery.PathFinder):
 
     Responsible for locating source files
     and loading them with the appropriate loader
+
+    Directories are searched with Directory, which indexes each listing
+    by module name, so lookups don't slow down as more suffixes are
+    registered. Path entries inside zip archives are searched with Archive
+
+    By default Finder sits on sys.meta_path and searches sys.path itself,
+    after the stdlib PathFinder has already done so; python modules and
+    namespace packages are the PathFinder's. Only where the PathFinder's
+    FileFinders and zipimporters see a namespace portion do they ask
+    Finder (see CustomPackages), so a directory with a custom
+    __init__ is a package rather than a namespace package
+
+    Alternatively .install_path_hook() makes the stdlib FileFinders
+    find custom modules too, so each directory is only searched once
+    (but zip archives are then left to zipimport, which only
+    handles python files, and the FileFinders try each suffix in turn)
+
+    Modules that aren't found are remembered per (name, path), until one
+    of the path entries' modification time changes, .invalidate_caches()
+    is called or the registered loaders change. Optional imports are
+    often probed again and again; .negative_cache_info() has the counts
     """
 
-    _loaders = []
-    _suffixes = []
+    # suffix: (priority, loader)
+    _registry = {}
+    # [(loader, suffixes)] for FileFinder/Directory, highest priority first
+    _details = []
+    # _details after the standard ones, for FileFinder.path_hook
+    _search_details = STANDARD_DETAILS
+    _finders = {}
+    _path_hook = None
+    _lock = threading.RLock()
+    # (fullname, path entries): their mtimes when fullname wasn't found
+    _not_found = {}
+    _not_found_limit = 10000
+    _not_found_hits = 0
+    _not_found_misses = 0
+    # bumped by every registration change
+    _generation = 0
 
     @classmethod
-    def find_module(cls, fullname, path):
-        details = list(zip(cls._loaders, cls._suffixes))
+    def find_spec(cls, fullname, path = None, target = None):
+        if not cls._details:
+            return None
         if path is None:
             path = sys.path
 
+        generation = cls._generation
+        key = (fullname, tuple(path))
+        stamps = tuple(cls._stamp(i) for i in key[1])
+        if cls._not_found.get(key) == stamps:
+            cls._not_found_hits += 1
+            return None
+        cls._not_found_misses += 1
+
+        portions = False
         for i in path:
-            loader, portions = importlib.machinery.FileFinder(i, *details).find_loader(fullname)
-            if loader:
-                return loader
+            spec = cls._find_in(fullname, i)
+            if spec is None:
+                continue
+            if spec.loader is None:
+                portions = True
+                continue
+            return spec
+
+        if portions:
+            # namespace package. The PathFinder builds it, so that its
+            # __path__ follows portions added to sys.path later on
+            spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+            if spec is not None and spec.loader is None:
+                return spec
+
+        with cls._lock:
+            # not if the loaders changed while searching
+            if cls._generation == generation:
+                if len(cls._not_found) >= cls._not_found_limit:
+                    cls._not_found.clear()
+                cls._not_found[key] = stamps
+        return None
+
+    @classmethod
+    def _find_in(cls, fullname, entry):
+        """
+        Returns the spec of @fullname in sys.path @entry,
+        a namespace portion spec (no loader) or None
+        """
+
+        archive = Archive.find(entry)
+        if archive is not None:
+            archive, prefix = archive
+            spec = archive.find_spec(fullname, prefix, cls._details)
+        else:
+            spec = cls._finder(entry).find_spec(fullname)
+
+        if spec is not None and isinstance(spec.loader, Loader):
+            # the stdlib only knows the cache paths of .py files
+            spec.cached = spec.loader.cache_path()
+        return spec
+
+    @staticmethod
+    def _stamp(entry):
+        """
+        Returns the modification time of path @entry (or of the
+        archive it is in), which changes when files are added to
+        or removed from it, or None if there is no such path
+        """
+
+        try:
+            return os.stat(entry or os.curdir).st_mtime_ns
+        except OSError:
+            archive = Archive.find(entry)
+            return None if archive is None else archive[0].mtime
 
     @classmethod
-    def find_spec(cls, fullname, path, target):
-        loader = cls.find_module(fullname, path)
-        if loader:
-            return importlib.util.spec_from_loader(fullname, loader)
+    def negative_cache_info(cls):
+        """
+        Returns the hits and misses of the cache of modules that
+        weren't found, and how many are in it
+        """
+
+        return {'hits': cls._not_found_hits, 'misses': cls._not_found_misses, 'size': len(cls._not_found)}
+
+    @classmethod
+    def _finder(cls, entry):
+        """
+        Returns the Directory for path @entry
+
+        These are cached (like sys.path_importer_cache) so the directory
+        listings are only refreshed when the directory changes. They are
+        built under the lock, so none is kept with the details from before
+        a registration change
+        """
+
+        entry = entry or os.getcwd()
+        try:
+            return cls._finders[entry]
+        except KeyError:
+            with cls._lock:
+                finder = cls._finders.get(entry)
+                if finder is None:
+                    finder = cls._finders[entry] = Directory(entry, cls._details)
+                return finder
+
+    @classmethod
+    def invalidate_caches(cls):
+        cls._not_found.clear()
+        Archive.invalidate_caches()
+        for finder in list(cls._finders.values()):
+            finder.invalidate_caches()
+
+    @classmethod
+    def install_path_hook(cls):
+        """
+        Replace Finder on sys.meta_path with a sys.path_hooks entry
+        creating FileFinders for both the standard and registered loaders
+        """
+
+        cls.uninstall_path_hook()
+
+        cls._path_hook = importlib.machinery.FileFinder.path_hook(*cls._search_details)
+
+        # before the stdlib FileFinder hook, which accepts any directory
+        sys.path_hooks.insert(0, cls._path_hook)
+        sys.path_importer_cache.clear()
+        if cls in sys.meta_path:
+            sys.meta_path.remove(cls)
 
     @classmethod
-    def register(cls, loader, suffixes):
+    def uninstall_path_hook(cls):
+        """
+        Undo .install_path_hook()
+        """
+
+        if cls._path_hook is None:
+            return
+
+        if cls._path_hook in sys.path_hooks:
+            sys.path_hooks.remove(cls._path_hook)
+        cls._path_hook = None
+        sys.path_importer_cache.clear()
+        cls._install()
+
+    @classmethod
+    def _install(cls):
+        """
+        Put Finder on sys.meta_path, after the stdlib PathFinder,
+        and the package finders on sys.path_hooks
+        """
+
+        if cls not in sys.meta_path:
+            sys.meta_path.append(cls)
+        if PACKAGE_HOOK in sys.path_hooks:
+            return
+
+        if zipimport.zipimporter in sys.path_hooks:
+            sys.path_hooks[sys.path_hooks.index(zipimport.zipimporter)] = PackageZipImporter
+        # before the stdlib FileFinder hook, which accepts any directory
+        sys.path_hooks.insert(0, PACKAGE_HOOK)
+        for entry, finder in list(sys.path_importer_cache.items()):
+            if type(finder) in (importlib.machinery.FileFinder, zipimport.zipimporter):
+                del sys.path_importer_cache[entry]
+
+    @classmethod
+    def register(cls, loader, suffixes, priority = 0):
         """
         Register a loader to handle file names with @suffixes
 
         @suffixes:      list of strings
+        @priority:      when a suffix is already registered, it goes to
+                        the loader with the higher priority (or the
+                        newest on a tie). When files with different
+                        suffixes match a module, the higher priority wins
+        """
+
+        with cls._lock:
+            for suffix in suffixes:
+                current = cls._registry.get(suffix)
+                if current is None or priority >= current[0]:
+                    cls._registry[suffix] = (priority, loader)
+            cls._update()
+
+    @classmethod
+    def unregister(cls, loader = None, suffixes = ()):
+        """
+        Unregister all the suffixes of @loader and/or @suffixes
+        """
+
+        with cls._lock:
+            for suffix, (priority, registered) in list(cls._registry.items()):
+                if registered is loader or suffix in suffixes:
+                    del cls._registry[suffix]
+            cls._update()
+
+    @classmethod
+    def loader_for(cls, suffix):
+        """
+        Returns the loader registered for @suffix or None
+        """
+
+        return cls._registry.get(suffix, (None, None))[1]
+
+    @classmethod
+    def _update(cls):
+        """
+        Rebuild the details passed to Directories and FileFinders
+        after a registration change
         """
 
-        cls._loaders.append(loader)
-        cls._suffixes.append(suffixes)
+        groups = []
+        for suffix, (priority, loader) in cls._registry.items():
+            for group in groups:
+                if group[0] == priority and group[1] is loader:
+                    group[2].append(suffix)
+                    break
+            else:
+                groups.append((priority, loader, [suffix]))
+
+        groups.sort(key = lambda group: -group[0])
+        cls._details = [(loader, suffixes) for priority, loader, suffixes in groups]
+        cls._search_details = STANDARD_DETAILS + cls._details
+        cls._generation += 1
+        cls._finders.clear()
+        cls._not_found.clear()
+        if cls._path_hook is not None:
+            # rebuild the hook with the new loaders
+            cls.install_path_hook()
+
+class CustomPackages:
+    """
+    Mixin for the stdlib's path entry finders
+
+    Where they only find a namespace portion, Finder is asked for a
+    package with a custom __init__ (or a custom module) of that name in
+    the same path entry. Other lookups aren't slowed down
+    """
+
+    def find_spec(self, fullname, target = None):
+        spec = super().find_spec(fullname, target)
+        if spec is not None and spec.loader is None and Finder._details:
+            custom = Finder._find_in(fullname, self.entry)
+            if custom is not None and custom.loader is not None:
+                return custom
+        return spec
+
+class PackageFileFinder(CustomPackages, importlib.machinery.FileFinder):
+    @property
+    def entry(self):
+        return self.path
+
+class PackageZipImporter(CustomPackages, zipimport.zipimporter):
+    def __init__(self, path):
+        super().__init__(path)
+        self.entry = path
+
+PACKAGE_HOOK = PackageFileFinder.path_hook(*STANDARD_DETAILS)
 
-if Finder not in sys.meta_path:
-    sys.meta_path.append(Finder)
+Finder._install()
@@ -1,7 +1,43 @@
+import _imp
 import importlib.machinery
+import importlib.util
+import io
 import marshal
 import functools
-import ctypes
+import os
+import sys
+import threading
+import types
+
+from .dependencies import dependencies
+
+# bytecode header: magic, (flags since 3.7), mtime, source size
+HEADER_SIZE = 16 if sys.version_info >= (3, 7) else 12
+
+def fix_co_filename(code_object, path):
+    """
+    Returns @code_object with its co_filename (and that of the code
+    objects nested in it) set to @path, as importlib does for bytecode
+    that was moved with its source
+    
+    Uses the interpreter's private _imp._fix_co_filename where there is
+    one, otherwise rebuilds the code objects with code.replace()
+    """
+    
+    fix = getattr(_imp, '_fix_co_filename', None)
+    if fix is not None:
+        fix(code_object, path)
+        return code_object
+    return _replace_co_filename(code_object, code_object.co_filename, path)
+
+def _replace_co_filename(code_object, old, new):
+    if code_object.co_filename != old:
+        return code_object
+    consts = tuple(
+        _replace_co_filename(c, old, new) if isinstance(c, types.CodeType) else c
+        for c in code_object.co_consts
+    )
+    return code_object.replace(co_filename = new, co_consts = consts)
 
 class Loader(importlib.machinery.SourceFileLoader):
     """
@@ -33,27 +69,199 @@ class Loader(importlib.machinery.SourceFileLoader):
         
         This allows you to separate custom compiled bytecode
         from normal python bytecode.
+    
+    optimize is the optimization level (as for compile()) used for the
+    bytecode, by default the interpreter's (-O, -OO). Like python's own,
+    the cached bytecode of each level is kept apart:
+        /path/to/bytecode.cpython-33.opt-1.{magic-tag}.pyc
+    
+    cache_dir is a directory to keep the bytecode in instead of next to
+    the source, for sources on read-only filesystems. Like python's own
+    sys.pycache_prefix (which is used when cache_dir isn't set), the
+    source directories are mirrored under it:
+        {cache_dir}/path/to/bytecode.cpython-33.{magic-tag}.pyc
+    
+    store is a cache of compiled code shared between machines, such as a
+    DirectoryStore. Code is looked up there before translating and
+    published there after, as well as being written as bytecode locally
+    
+    When archive is set (see Archive), the source and bytecode are read
+    from inside a zip archive and bytecode is never written.
+    
+    Loaders are thread safe: the source stats recorded by .path_stats()
+    for .get_data() are per thread and the compiler and code object
+    are created under a lock
     """
     
-    _size = None
     _compiler = None
     _code_object = None
     _recompile = False
+    _archive = None
+    _optimize = None
+    _cache_dir = None
+    _store = None
     
-    def __init__(self, *args, compiler, recompile = False, **kwargs):
+    def __init__(self, *args, compiler, recompile = False, archive = None, optimize = None, cache_dir = None, store = None, **kwargs):
         super().__init__(*args, **kwargs)
         self._compiler_cls = compiler
         self._recompile = recompile
+        self._archive = archive
+        self._optimize = optimize
+        self._cache_dir = cache_dir
+        self._store = store
+        self._local = threading.local()
+        self._lock = threading.RLock()
+    
+    @property
+    def optimize(self):
+        return sys.flags.optimize if self._optimize is None else self._optimize
+    
+    # set by .path_stats() and read by .get_data() in the same get_code() call
+    @property
+    def _size(self):
+        return getattr(self._local, 'size', None)
+    
+    @_size.setter
+    def _size(self, value):
+        self._local.size = value
+    
+    @property
+    def _mtime(self):
+        return getattr(self._local, 'mtime', None)
+    
+    @_mtime.setter
+    def _mtime(self, value):
+        self._local.mtime = value
     
     @classmethod
     def factory(cls, **kwargs):
         return functools.partial(cls, **kwargs)
     
+    @classmethod
+    def precompile(cls, paths, **kwargs):
+        """
+        Write bytecode for each of @paths, translating them in
+        one batch with Compiler.translate_many()
+        
+        @kwargs are as for .factory()
+        Yields each path once its bytecode has been written
+        
+        With a store, the paths whose code is already stored
+        aren't translated at all
+        """
+        
+        def loader_for(path):
+            name = os.path.splitext(os.path.basename(path))[0]
+            return cls(name, path, **kwargs)
+        
+        def write(loader):
+            # same header as SourceLoader writes; the size is 0 as get_data()
+            # returns no source and is patched back in when read
+            mtime = int(loader.path_stats(loader.path)['mtime']) & 0xFFFFFFFF
+            header = importlib.util.MAGIC_NUMBER + bytes(HEADER_SIZE - 12) + mtime.to_bytes(4, 'little') + bytes(4)
+            loader.set_data(loader.cache_path(), header)
+        
+        if kwargs.get('store') is not None:
+            remaining = []
+            for path in paths:
+                loader = loader_for(path)
+                code_object = loader.stored_code(loader.optimize)
+                if code_object is None:
+                    remaining.append(path)
+                    continue
+                loader._code_object = code_object
+                write(loader)
+                yield path
+            paths = remaining
+        
+        for compiler in kwargs['compiler'].translate_many(paths):
+            loader = loader_for(compiler.path)
+            loader._compiler = compiler
+            write(loader)
+            yield compiler.path
+    
     @property
     def compiler(self):
-        if self._compiler is None:
-            self._compiler = self._compiler_cls(self.path)
-        return self._compiler
+        with self._lock:
+            if self._compiler is None:
+                self._compiler = self.make_compiler()
+            return self._compiler
+    
+    def make_compiler(self):
+        """
+        Returns a new compiler for the source
+        """
+        
+        if self._archive is None:
+            return self._compiler_cls(self.path)
+        return self._compiler_cls(io.StringIO(self.get_source(self.name)), self.path)
+    
+    def get_source(self, fullname, translated = False):
+        """
+        Returns the original source, which is what the line numbers
+        in tracebacks refer to
+        
+        If @translated, returns the translated python instead
+        (translating again if the compiler has been released)
+        """
+        
+        if translated:
+            compiler = self._compiler or self.make_compiler()
+            return compiler.get_source(line_numbers = False)
+        return importlib.util.decode_source(self.read_data(self.path))
+    
+    def cache_path(self):
+        """
+        Returns the path of the cached bytecode for this module
+        """
+        
+        optimization = self.optimize or ''
+        path = importlib.util.cache_from_source(self.path, optimization = optimization)
+        if self._cache_dir is not None:
+            # as cache_from_source() does for sys.pycache_prefix
+            directory = os.path.splitdrive(os.path.dirname(os.path.abspath(self.path)))[1]
+            path = os.path.join(self._cache_dir, directory.lstrip(os.sep), os.path.basename(path))
+        return self.apply_compiler_magic_tag(path)
+    
+    def cache_is_current(self):
+        """
+        Returns whether there is bytecode at .cache_path() for the
+        current source, compiler MAGIC and python version
+        """
+        
+        try:
+            header = self.read_data(self.cache_path())[:HEADER_SIZE]
+            mtime = int(self.path_stats(self.path)['mtime']) & 0xFFFFFFFF
+        except OSError:
+            return False
+        
+        magic = self.apply_compiler_magic(header[:4])
+        # the flags (3.7+) are 0 for bytecode checked by mtime
+        flags = header[4:HEADER_SIZE - 8]
+        return magic == importlib.util.MAGIC_NUMBER and not any(flags) and header[HEADER_SIZE - 8:HEADER_SIZE - 4] == mtime.to_bytes(4, 'little')
+    
+    def bytecode_path(self, path):
+        """
+        Returns the path of the bytecode that importlib asks for at @path
+        
+        importlib only knows the interpreter's optimization level,
+        so its usual path is swapped for .cache_path()
+        (.precompile() passes .cache_path() itself, which is kept)
+        """
+        
+        cache_path = self.cache_path()
+        if path in (cache_path, importlib.util.cache_from_source(self.path)):
+            return cache_path
+        return self.apply_compiler_magic_tag(path)
+    
+    def read_data(self, path):
+        """
+        Returns the raw contents of @path
+        """
+        
+        if self._archive is not None:
+            return self._archive.read(path)
+        return super().get_data(path)
     
     def get_data(self, path):
         if path != self.path:
@@ -62,16 +270,18 @@ class Loader(importlib.machinery.SourceFileLoader):
                 raise OSError()
             
             # return bytecode but set the size to the original file size
-            path = self.apply_compiler_magic_tag(path)
-            data = super().get_data(path)
+            path = self.bytecode_path(path)
+            data = self.read_data(path)
             
             magic = data[:4]
-            mtime = data[4:8]
-            size = data[8:12]
-            code = data[12:]
+            mtime = data[4:HEADER_SIZE - 4]
+            size = data[HEADER_SIZE - 4:HEADER_SIZE]
+            code = data[HEADER_SIZE:]
             
             magic = self.apply_compiler_magic(magic)
             size = self._size.to_bytes(4, 'little')
+            if self._archive is not None:
+                mtime = self._match_archive_mtime(mtime)
             
             data = magic + mtime + size + code
             return data
@@ -81,41 +291,132 @@ class Loader(importlib.machinery.SourceFileLoader):
         return ''
     
     def source_to_code(self, data, path, *args, original_code=None, **kwargs):
-        if self._code_object is None:
-            if original_code:
-                self._code_object = original_code
-            else:
-                # modify the line numbers in the AST
-                tree = self.compiler.make_ast_tree()
-                self._code_object = compile(tree, path, 'exec', *args, **kwargs)
-        return self._code_object
+        with self._lock:
+            if self._code_object is None:
+                if original_code:
+                    self._code_object = original_code
+                else:
+                    # py_compile passes its optimization level as _optimize
+                    optimize = kwargs.pop('_optimize', -1)
+                    if optimize == -1:
+                        optimize = self.optimize
+                    code_object = self.stored_code(optimize)
+                    if code_object is None:
+                        # with the line numbers of the original source
+                        code_object = self.compiler.make_code(path, *args, optimize = optimize, **kwargs)
+                        self.store_code(code_object, optimize)
+                    self._code_object = code_object
+            return self._code_object
+    
+    def _store_key(self, optimize):
+        return self._store.key(self.read_data(self.path), self._compiler_cls, optimize)
+    
+    def stored_code(self, optimize):
+        """
+        Returns the code object compiled at @optimize level for
+        the current source from the store, or None
+        """
+        
+        if self._store is None or self._recompile:
+            return None
+        try:
+            data = self._store.get(self._store_key(optimize))
+        except OSError:
+            return None
+        if data is None:
+            return None
+        
+        try:
+            code_object = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            return None
+        # compiled elsewhere
+        return fix_co_filename(code_object, self.path)
+    
+    def store_code(self, code_object, optimize):
+        """
+        Publish @code_object, compiled at @optimize level, to the store
+        """
+        
+        if self._store is None or self._recompile:
+            return
+        try:
+            self._store.put(self._store_key(optimize), marshal.dumps(code_object))
+        except OSError:
+            pass
+    
+    def exec_module(self, module):
+        if self._archive is not None:
+            # lets linecache fetch the original source (only when needed),
+            # it can't read files in archives itself
+            import linecache
+            linecache.lazycache(self.path, module.__dict__)
+        try:
+            super().exec_module(module)
+        finally:
+            # the loader lives on as module.__loader__, so don't keep
+            # the translation around; .compiler recreates it if needed
+            self.release()
+    
+    def release(self):
+        """
+        Drop the compiler (and the translated source it holds)
+        and the code object
+        """
+        
+        with self._lock:
+            self._compiler = None
+            self._code_object = None
     
     def get_code(self, fullname):
         code_object = super().get_code(fullname)
-        return self.source_to_code(None, self.path, original_code=code_object)
+        code_object = self.source_to_code(None, self.path, original_code=code_object)
+        
+        package = fullname if self.is_package(fullname) else fullname.rpartition('.')[0]
+        dependencies.record(fullname, code_object, package)
+        return code_object
     
     def set_data(self, path, data, *args, **kwargs):
+        if self._archive is not None:
+            # archives are read only
+            return
+        
         # use the code with modified line numbers
         code_object = self.source_to_code(None, self.path)
         
         magic = data[:4]
-        mtime = data[4:8]
-        size = data[8:12]
-        code = data[12:]
+        mtime = data[4:HEADER_SIZE - 4]
+        size = data[HEADER_SIZE - 4:HEADER_SIZE]
+        code = data[HEADER_SIZE:]
         
         magic = self.apply_compiler_magic(magic)
         code = marshal.dumps(code_object)
         
         data = magic + mtime + size + code
-        path = self.apply_compiler_magic_tag(path)
+        path = self.bytecode_path(path)
         return super().set_data(path, data, *args, **kwargs)
     
     def path_stats(self, path):
-        result = super().path_stats(path)
+        if self._archive is not None:
+            result = self._archive.stat(path)
+            self._mtime = int(result['mtime'])
+        else:
+            result = super().path_stats(path)
         # store the original file size for later
         self._size = result['size']
         return result
     
+    def _match_archive_mtime(self, mtime):
+        """
+        Zip archives only store times to 2 seconds, so like zipimport
+        accept bytecode whose mtime is within a second of the source
+        """
+        
+        flags, mtime = mtime[:-4], mtime[-4:]
+        if abs(int.from_bytes(mtime, 'little') - (self._mtime & 0xFFFFFFFF)) <= 1:
+            mtime = (self._mtime & 0xFFFFFFFF).to_bytes(4, 'little')
+        return flags + mtime
+    
     def apply_compiler_magic(self, magic):
         """
         XOR the (bit flipped) compiler magic with @magic
@@ -127,7 +428,7 @@ class Loader(importlib.machinery.SourceFileLoader):
         
         tail = magic[2:]
         magic = int.from_bytes(magic[:2], 'little') ^ self._compiler_cls.MAGIC
-        magic = ctypes.c_uint16(magic).value.to_bytes(2, 'little')
+        magic = (magic & 0xFFFF).to_bytes(2, 'little')
         
         return magic + tail
     
@@ -0,0 +1,291 @@
+"""
+AST passes for Compiler.passes
+
+Each pass is an ast.NodeTransformer run over the translated module
+after the line numbers have been fixed. Their output ends up in the
+cached bytecode, so they only cost anything when a module is compiled
+
+Passes must keep the meaning of the code. FoldStrings and
+RemoveDeadBranches only touch code they can prove is unaffected;
+HoistAttributes relies on what the caller says about its names
+"""
+
+import ast
+
+# nodes that start a new scope
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef,
+    ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+# nodes that bind names or make a function a generator/coroutine
+BINDING = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom,
+    ast.Global, ast.Nonlocal, ast.Yield, ast.YieldFrom, ast.Await, ast.NamedExpr, ast.ExceptHandler)
+# match statements (3.10+)
+BINDING += tuple(getattr(ast, n) for n in ('MatchAs', 'MatchStar', 'MatchMapping') if hasattr(ast, n))
+
+# nodes that bind their .name (which may be None)
+NAMED = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.ExceptHandler)
+NAMED += tuple(getattr(ast, n) for n in ('MatchAs', 'MatchStar') if hasattr(ast, n))
+MatchMapping = getattr(ast, 'MatchMapping', None)
+
+def binds_names(nodes):
+    """
+    Returns whether @nodes bind names (or make a function a generator),
+    so can't be removed without changing the meaning of the code around
+    them. Nested scopes are included, to be on the safe side
+    """
+
+    for statement in nodes:
+        for node in ast.walk(statement):
+            if isinstance(node, BINDING):
+                return True
+            if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+                return True
+    return False
+
+def bound_name(node):
+    """
+    Returns the name @node binds in the scope it is in, or None
+    """
+
+    if isinstance(node, ast.Name):
+        return None if isinstance(node.ctx, ast.Load) else node.id
+    if isinstance(node, ast.alias):
+        # import a.b binds a
+        return (node.asname or node.name).partition('.')[0]
+    if isinstance(node, NAMED):
+        return node.name
+    if MatchMapping is not None and isinstance(node, MatchMapping):
+        return node.rest
+    return None
+
+def is_str(node):
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+def find(tree, types):
+    """
+    Returns ( parent, field, index, node ) for each node of @types
+    in @tree, parents before their children
+    index is None unless the field is a list
+
+    Much quicker than visiting every node with a NodeTransformer
+    """
+
+    found = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                for i, child in enumerate(value):
+                    if isinstance(child, ast.AST):
+                        if isinstance(child, types):
+                            found.append((node, field, i, child))
+                        stack.append(child)
+            elif isinstance(value, ast.AST):
+                if isinstance(value, types):
+                    found.append((node, field, None, value))
+                stack.append(value)
+    return found
+
+def replace(parent, field, index, node):
+    if index is None:
+        setattr(parent, field, node)
+    else:
+        getattr(parent, field)[index] = node
+
+class FoldStrings(ast.NodeTransformer):
+    """
+    Folds concatenations of string constants, including
+    'separator'.join() of a list or tuple of them
+
+    'a' + 'b'               -> 'ab'
+    ' '.join(('a', 'b'))    -> 'a b'
+    """
+
+    def visit(self, tree):
+        # children first, so nested concatenations fold completely
+        for parent, field, index, node in reversed(find(tree, (ast.BinOp, ast.Call))):
+            folded = self.fold(node)
+            if folded is not None:
+                replace(parent, field, index, ast.copy_location(ast.Constant(folded), node))
+        return tree
+
+    @staticmethod
+    def fold(node):
+        if isinstance(node, ast.BinOp):
+            if isinstance(node.op, ast.Add) and is_str(node.left) and is_str(node.right):
+                return node.left.value + node.right.value
+            return None
+
+        func = node.func
+        if (
+            isinstance(func, ast.Attribute) and func.attr == 'join' and is_str(func.value)
+            and len(node.args) == 1 and not node.keywords
+            and isinstance(node.args[0], (ast.List, ast.Tuple))
+            and all(is_str(i) for i in node.args[0].elts)
+        ):
+            return func.value.value.join(i.value for i in node.args[0].elts)
+        return None
+
+class RemoveDeadBranches(ast.NodeTransformer):
+    """
+    Removes code that can never run:
+        - the untaken branch of an if with a constant test
+        - while loops with a false constant test
+        - statements after a return, raise, break or continue
+
+    Code that binds names (and so changes their scope) or makes
+    a function a generator is left alone
+    """
+
+    def visit(self, tree):
+        # statements are only ever in lists of statements,
+        # so expressions don't need looking at
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            for field in node._fields:
+                value = getattr(node, field, None)
+                if not (isinstance(value, list) and value and isinstance(value[0], ast.AST)):
+                    continue
+                if isinstance(value[0], ast.stmt):
+                    pruned = self.prune(value)
+                    if not pruned and field not in ('orelse', 'finalbody'):
+                        pruned = [ast.copy_location(ast.Pass(), value[0])]
+                    value[:] = pruned
+                # statements, except handlers and match cases
+                if not isinstance(value[0], ast.expr):
+                    stack.extend(value)
+        return tree
+
+    def prune(self, body):
+        result = []
+        for i, stmt in enumerate(body):
+            if isinstance(stmt, ast.If) and isinstance(stmt.test, ast.Constant):
+                taken, dead = (stmt.body, stmt.orelse) if stmt.test.value else (stmt.orelse, stmt.body)
+                if not binds_names(dead):
+                    result.extend(self.prune(taken))
+                    continue
+            elif isinstance(stmt, ast.While) and isinstance(stmt.test, ast.Constant) and not stmt.test.value:
+                if not binds_names(stmt.body):
+                    result.extend(self.prune(stmt.orelse))
+                    continue
+
+            result.append(stmt)
+            if isinstance(stmt, (ast.Return, ast.Raise, ast.Break, ast.Continue)):
+                if not binds_names(body[i + 1:]):
+                    break
+        return result
+
+class HoistAttributes(ast.NodeTransformer):
+    """
+    In each function, loads name.attribute into a local once
+    instead of every time it is used, for the given @names
+
+        def f():                    def f():
+            x.append(1)     ->          _hoisted_x_append = x.append
+            x.append(2)                 _hoisted_x_append(1)
+                                        _hoisted_x_append(2)
+
+    Only for attributes used at least @min_uses times that the function
+    doesn't assign or delete, of names that neither the function nor
+    those nested in it bind (by assignment, import, except ... as,
+    match captures, def or class). The attribute is loaded when the
+    function starts, even where every use is conditional, so @names
+    must be of objects that exist and have those attributes by then,
+    and whose attributes nothing else changes while it runs. Unlike the
+    other passes this can break code that doesn't hold to that:
+
+        if x is not None:           _hoisted_x_append = x.append
+            x.append(1)     ->      if x is not None:
+            x.append(2)                 ...      # AttributeError if x is None
+    """
+
+    FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+    def __init__(self, names, min_uses = 2):
+        self.names = set(names)
+        self.min_uses = min_uses
+
+    def visit(self, tree):
+        names = self.names
+        # { function: { (name, attribute): [ (parent, field, index, node) ] } }
+        uses = {}
+        rebound = set()
+        # { function: {(name, attribute)} } assigned or deleted
+        changed = {}
+
+        # ( node, enclosing functions, function whose scope node is in )
+        stack = [(tree, (), None)]
+        while stack:
+            node, functions, scope = stack.pop()
+            body_scope = scope
+            if isinstance(node, self.FUNCTIONS):
+                arguments = node.args.posonlyargs + node.args.args + node.args.kwonlyargs + [node.args.vararg, node.args.kwarg]
+                if any(a is not None and a.arg in names for a in arguments):
+                    rebound.add(node)
+                functions += (node,)
+                # decorators and defaults are run outside the function;
+                # just leave them be
+                body_scope = node
+                scope = None
+            elif isinstance(node, SCOPES):
+                body_scope = scope = None
+
+            for field in node._fields:
+                value = getattr(node, field, None)
+                field_scope = body_scope if field == 'body' else scope
+                if isinstance(value, list):
+                    children = enumerate(value)
+                elif isinstance(value, ast.AST):
+                    children = [(None, value)]
+                else:
+                    continue
+
+                for index, child in children:
+                    if bound_name(child) in names:
+                        rebound.update(functions)
+                    elif (
+                        isinstance(child, ast.Attribute)
+                        and isinstance(child.value, ast.Name) and child.value.id in names
+                    ):
+                        attribute = (child.value.id, child.attr)
+                        if not isinstance(child.ctx, ast.Load):
+                            for function in functions:
+                                changed.setdefault(function, set()).add(attribute)
+                        elif field_scope is not None:
+                            uses.setdefault(field_scope, {}).setdefault(attribute, []).append((node, field, index, child))
+                    if isinstance(child, ast.AST):
+                        stack.append((child, functions, field_scope))
+
+        for function, attributes in uses.items():
+            if function not in rebound:
+                self.hoist(function, attributes, changed.get(function, ()))
+        return tree
+
+    def hoist(self, function, attributes, changed = ()):
+        hoisted = []
+        for (name, attr), places in sorted(attributes.items()):
+            if len(places) < self.min_uses or (name, attr) in changed:
+                continue
+
+            local = '_hoisted_{}_{}'.format(name.lstrip('_'), attr)
+            for parent, field, index, node in places:
+                replace(parent, field, index, ast.copy_location(ast.Name(local, ast.Load()), node))
+
+            hoisted.append(ast.Assign(
+                targets = [ast.Name(local, ast.Store())],
+                value = ast.Attribute(ast.Name(name, ast.Load()), attr, ast.Load()),
+            ))
+
+        if hoisted:
+            # after any docstring
+            start = 1 if ast.get_docstring(function, clean = False) is not None else 0
+            location = function.body[start] if start < len(function.body) else function
+            for assign in hoisted:
+                for child in ast.walk(assign):
+                    ast.copy_location(child, location)
+            function.body[start:start] = hoisted
+
+__all__ = ['FoldStrings', 'RemoveDeadBranches', 'HoistAttributes']
@@ -0,0 +1,138 @@
+import concurrent.futures
+import functools
+import gc
+import importlib
+import os
+import sys
+import time
+
+from .finder import Finder
+
+def suffix_of(filename):
+    """
+    Returns the longest suffix registered with the Finder that
+    @filename ends with, or None
+    """
+
+    matches = [s for s in Finder._registry if filename.endswith(s)]
+    return max(matches, key = len) if matches else None
+
+def find_modules(package_or_paths):
+    """
+    Returns [(module name, path)] for every custom module (with a suffix
+    registered with the Finder) in @package_or_paths, which is a package
+    (or its name) or a list of directories on sys.path
+    Subpackages are searched too
+    """
+
+    if isinstance(package_or_paths, str):
+        package_or_paths = importlib.import_module(package_or_paths)
+
+    if hasattr(package_or_paths, '__path__'):
+        roots = [(d, package_or_paths.__name__ + '.') for d in package_or_paths.__path__]
+    else:
+        roots = []
+        for directory in package_or_paths:
+            if os.path.abspath(directory) not in map(os.path.abspath, sys.path):
+                raise ValueError('{} is not on sys.path'.format(directory))
+            roots.append((directory, ''))
+
+    modules = []
+    for root, prefix in roots:
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = sorted(d for d in subdirectories if d.isidentifier())
+            relative = os.path.relpath(directory, root)
+            package = prefix if relative == os.curdir else prefix + relative.replace(os.sep, '.') + '.'
+
+            for filename in sorted(files):
+                suffix = suffix_of(filename)
+                if suffix is None:
+                    continue
+                name = filename[:-len(suffix)]
+                if name == '__init__':
+                    name = package.rstrip('.')
+                elif name.isidentifier():
+                    name = package + name
+                else:
+                    continue
+                if name:
+                    modules.append((name, os.path.join(directory, filename)))
+    return modules
+
+def precompile(loader, paths):
+    """
+    Write the bytecode for @paths with @loader (a Loader.factory())
+    Run in the worker processes
+    """
+
+    return list(loader.func.precompile(paths, **loader.keywords))
+
+def preload(package_or_paths, workers = None, freeze = False):
+    """
+    Import every custom module in @package_or_paths (see find_modules)
+    so that a pre-forking server's workers share them copy-on-write
+
+    Modules whose bytecode is missing or stale are first translated and
+    compiled in @workers processes (default os.cpu_count()), so the
+    imports themselves only load bytecode. If @freeze, gc.freeze()
+    moves everything into the permanent generation afterwards, so the
+    garbage collector doesn't touch (and copy) those pages
+
+    Returns a dict of counts and timings
+    Raises ImportError if a module isn't imported from the file found
+    """
+
+    start = time.perf_counter()
+    # a package is imported to find its modules
+    already = set(sys.modules)
+    modules = find_modules(package_or_paths)
+
+    # { loader: [paths] } of the modules that need compiling
+    stale = {}
+    for name, path in modules:
+        loader = Finder.loader_for(suffix_of(path))
+        if not isinstance(loader, functools.partial) or loader.keywords.get('recompile'):
+            # can't be precompiled, or wouldn't use the bytecode
+            continue
+        if not loader(name, path).cache_is_current():
+            stale.setdefault(loader, []).append(path)
+
+    discovered = time.perf_counter()
+    compiled = 0
+    if stale and not sys.dont_write_bytecode:
+        workers = workers or os.cpu_count() or 1
+        jobs = [(loader, paths[i::workers]) for loader, paths in stale.items() for i in range(workers) if paths[i::workers]]
+        if workers > 1 and len(jobs) > 1:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                results = executor.map(precompile, *zip(*jobs))
+                compiled = sum(len(r) for r in results)
+        else:
+            compiled = sum(len(precompile(loader, paths)) for loader, paths in jobs)
+
+    precompiled = time.perf_counter()
+    for name, path in modules:
+        # the loaders drop their compilers once the module has run
+        module = importlib.import_module(name)
+        if getattr(module.__spec__, 'origin', None) != path:
+            # e.g. a module earlier on sys.path with the same name
+            raise ImportError('{} was imported from {} rather than {}'.format(
+                name, getattr(module.__spec__, 'origin', None), path), name = name, path = path)
+
+    imported = sum(name not in already for name, path in modules)
+    loaded = time.perf_counter()
+    frozen = 0
+    if freeze:
+        gc.collect()
+        gc.freeze()
+        frozen = gc.get_freeze_count()
+
+    return dict(
+        modules = len(modules),
+        compiled = compiled,
+        imported = imported,
+        frozen = frozen,
+        discover_seconds = discovered - start,
+        compile_seconds = precompiled - discovered,
+        import_seconds = loaded - precompiled,
+        seconds = time.perf_counter() - start,
+    )
@@ -0,0 +1,140 @@
+import importlib
+import os
+import sys
+import threading
+import traceback
+
+from .dependencies import dependencies
+from .finder import Finder
+from .loader import Loader
+
+class Reloader:
+    """
+    Reloader
+
+    Watches the source files of imported custom modules (those loaded
+    by a Loader from a suffix registered with the Finder) and reloads
+    the modules whose files change, along with the custom modules
+    that import them (see dependencies.dependents_of)
+
+    Files are polled; each poll lists every watched directory once
+    with os.scandir and compares mtimes. Only changed modules and
+    their dependents are reloaded, everything else keeps its module
+    and bytecode
+
+    Use .poll() to check once or .start() to poll in a background thread
+    """
+
+    def __init__(self, interval = 1):
+        self.interval = interval
+        self._mtimes = {}
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def modules(self):
+        """
+        Returns { source path: module } for all imported custom modules
+        """
+
+        suffixes = tuple(Finder._registry)
+        modules = {}
+        for module in list(sys.modules.values()):
+            path = getattr(module, '__file__', None)
+            if isinstance(getattr(module, '__loader__', None), Loader) and path and path.endswith(suffixes):
+                modules[path] = module
+        return modules
+
+    def changed(self):
+        """
+        Returns the modules whose source has changed since the last call
+        Modules seen for the first time are not considered changed
+        """
+
+        modules = self.modules()
+        directories = {}
+        for path in modules:
+            directories.setdefault(os.path.dirname(path), set()).add(path)
+
+        changed = []
+        for directory, paths in directories.items():
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+
+            for entry in entries:
+                if entry.path not in paths:
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+
+                previous = self._mtimes.get(entry.path)
+                self._mtimes[entry.path] = mtime
+                if previous is not None and previous != mtime:
+                    changed.append(modules[entry.path])
+        return changed
+
+    def poll(self):
+        """
+        Reload changed modules and their dependents, each after the
+        modules it imports
+        Returns the names of the reloaded modules
+        """
+
+        names = set()
+        for module in self.changed():
+            names.add(module.__name__)
+            names.update(dependencies.dependents_of(module))
+
+        reloaded = []
+        for name in self.reload_order(names):
+            module = sys.modules.get(name)
+            if module is not None:
+                importlib.reload(module)
+                reloaded.append(name)
+        return reloaded
+
+    @staticmethod
+    def reload_order(names):
+        """
+        Order @names so that each module comes after those it imports
+        """
+
+        remaining = set(names)
+        ordered = []
+        while remaining:
+            ready = {n for n in remaining if not dependencies.imports.get(n, set()) & (remaining - {n})}
+            # import cycle; just break it
+            ready = ready or remaining
+            ordered.extend(sorted(ready))
+            remaining -= ready
+        return ordered
+
+    def start(self):
+        """
+        Poll every .interval seconds in a daemon thread
+        """
+
+        if self._thread is not None:
+            return
+
+        self.changed()
+        self._stopped.clear()
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                # keep watching; the module is retried when it next changes
+                traceback.print_exc()
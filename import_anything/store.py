@@ -0,0 +1,96 @@
+import hashlib
+import importlib.util
+import os
+import tempfile
+
+class DirectoryStore:
+    """
+    DirectoryStore
+
+    A content-addressed cache of compiled code shared between machines,
+    e.g. on NFS, for Loader's store option
+
+    Code is kept by a key of the source's contents, the compiler (class,
+    MAGIC), the python version and the optimization level, so a module
+    compiled on one machine is reused by every other one with the same
+    source, wherever it is. Compilers whose output depends on the path
+    of the source shouldn't use one
+
+    Entries are written to a temporary file and renamed into place, so
+    readers never see a partial entry; two machines publishing the same
+    key at once both write the same code
+
+    Entries are code that is run on import, like bytecode. The directory
+    must be trusted and only writable by the user the code runs as:
+    anyone who can write an entry can run code in every process using it
+    """
+
+    def __init__(self, directory, mode = 0o644):
+        """
+        @directory:     where the entries are kept
+        @mode:          permissions of the entries, which other
+                        machines (and users) need to be able to read
+        """
+
+        self.directory = directory
+        self.mode = mode
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.directory)
+
+    @staticmethod
+    def key(source, compiler, optimize):
+        """
+        Returns the key for code compiled from @source (bytes)
+        by @compiler (class) at @optimize level
+        """
+
+        parts = [
+            hashlib.sha256(source).hexdigest(),
+            '{}.{}'.format(compiler.__module__, compiler.__qualname__),
+            repr(compiler.MAGIC),
+            importlib.util.MAGIC_NUMBER.hex(),
+            str(optimize),
+        ]
+        return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+    def path(self, key):
+        # split over subdirectories to keep directory listings short
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        """
+        Returns the data stored under @key or None
+        """
+
+        try:
+            with open(self.path(key), 'rb') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        """
+        Store @data under @key
+        Like writing bytecode, failing is not an error (returns False)
+        """
+
+        path = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            fd, temporary = tempfile.mkstemp(dir = os.path.dirname(path), prefix = '.tmp-')
+        except OSError:
+            return False
+
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.chmod(temporary, self.mode)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return False
+        return True
@@ -20,3 +20,4 @@ def strip_indents(string):
 
 from .complete_blocks import *
 from .tokenizer import *
+from .linetable import *
@@ -1,3 +1,4 @@
+import ast
 import functools
 from . import strip_indents, indent
 
@@ -21,6 +22,7 @@ def complete_blocks(indent_by = 4, body = 'pass'):
       pass
     unexpected_dedent
 
+    ast.stmt nodes may be yielded too, their col_offset is their indent.
     """
     return functools.partial(Block.decorator, indent_by = indent_by, body = body)
 
@@ -35,7 +37,10 @@ class Block(str):
             line_indent = 0
             last_lineno = 0
             for lineno, string in call:
-                line_indent = strip_indents(string)[0]
+                if isinstance(string, ast.stmt):
+                    line_indent = string.col_offset
+                else:
+                    line_indent = strip_indents(string)[0]
                 
                 if block_indent >= line_indent:
                     yield last_lineno, indent(block_indent + indent_by, body)
@@ -43,7 +48,7 @@ class Block(str):
                 
                 if isinstance(string, Block):
                     block_indent = line_indent
-                yield lineno, str(string)
+                yield lineno, string if isinstance(string, ast.stmt) else str(string)
                 last_lineno = lineno
             
             if block_indent >= line_indent:
@@ -0,0 +1,59 @@
+"""
+Location table utilities
+
+encode_locations() builds a code object's co_linetable (python 3.11+)
+from positions like those given by code.co_positions(), so that
+line numbers can be changed with code.replace()
+
+Format: Objects/locations.md in the CPython source
+    https://github.com/python/cpython/blob/3.11/Objects/locations.md
+"""
+
+import itertools
+
+# location entry codes
+LONG = 14
+NO_LOCATION = 15
+
+def write_varint(table, value):
+    while value >= 64:
+        table.append(0x40 | (value & 0x3f))
+        value >>= 6
+    table.append(value)
+
+def write_signed_varint(table, value):
+    write_varint(table, ((-value) << 1) | 1 if value < 0 else value << 1)
+
+def encode_locations(positions, firstlineno):
+    """
+    Returns the location table for @positions, one
+    ( lineno, end_lineno, col_offset, end_col_offset ) per code unit,
+    with line numbers relative to @firstlineno
+    
+    Every entry uses the long form, which can hold any position
+    """
+    
+    table = bytearray()
+    previous = firstlineno
+    for position, run in itertools.groupby(positions):
+        lineno, end_lineno, col, end_col = position
+        length = sum(1 for _ in run)
+        while length:
+            # an entry covers at most 8 code units
+            units = min(length, 8)
+            length -= units
+            
+            if lineno is None:
+                table.append(0x80 | (NO_LOCATION << 3) | (units - 1))
+                continue
+            
+            table.append(0x80 | (LONG << 3) | (units - 1))
+            write_signed_varint(table, lineno - previous)
+            write_varint(table, (end_lineno if end_lineno is not None else lineno) - lineno)
+            # columns are stored + 1, 0 means no column
+            write_varint(table, col + 1 if col is not None else 0)
+            write_varint(table, end_col + 1 if end_col is not None else 0)
+            previous = lineno
+    return bytes(table)
+
+__all__ = ['encode_locations']
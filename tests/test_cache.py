@@ -0,0 +1,139 @@
+import unittest
+import unittest.mock as mock
+from import_anything import Compiler, Finder, Loader
+from import_anything import cache
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+
+class CacheCompiler(Compiler):
+    MAGIC = 3
+    MAGIC_TAG = 'cache-test'
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.pycache = os.path.join(self.directory, '__pycache__')
+        
+        Finder.register(Loader.factory(compiler = CacheCompiler), ['.cache-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.cache-test'])
+        
+        for name in ['current', 'stale', 'version']:
+            with open(os.path.join(self.directory, name + '.cache-test'), 'w') as file:
+                file.write('x = 1\n')
+        
+        os.mkdir(self.pycache)
+        current = self.write('current', CacheCompiler)
+        self.write('stale', Compiler)
+        os.rename(self.write('orphan', CacheCompiler), os.path.join(self.pycache, 'orphan.{}.cache-test.pyc'.format(sys.implementation.cache_tag)))
+        with open(os.path.join(self.pycache, 'version.cpython-00.cache-test.pyc'), 'wb') as file:
+            file.write(b'\0' * 16)
+        # untagged bytecode isn't touched
+        with open(os.path.join(self.pycache, 'current.{}.pyc'.format(sys.implementation.cache_tag)), 'wb') as file:
+            file.write(b'\0' * 16)
+        
+        self.paths = {
+            status: os.path.join(self.pycache, '{}.{}.cache-test.pyc'.format(name, tag))
+            for status, name, tag in [
+                (cache.CURRENT, 'current', sys.implementation.cache_tag),
+                (cache.STALE_MAGIC, 'stale', sys.implementation.cache_tag),
+                (cache.ORPHANED, 'orphan', sys.implementation.cache_tag),
+                (cache.WRONG_VERSION, 'version', 'cpython-00'),
+            ]
+        }
+    
+    def write(self, name, compiler):
+        """
+        Write a header like @compiler's for module @name
+        """
+        
+        path = os.path.join(self.directory, name + '.cache-test')
+        loader = Loader(name, path, compiler = compiler)
+        header = loader.apply_compiler_magic(importlib.util.MAGIC_NUMBER) + bytes(12)
+        bytecode = os.path.join(self.pycache, '{}.{}.cache-test.pyc'.format(name, sys.implementation.cache_tag))
+        with open(bytecode, 'wb') as file:
+            file.write(header)
+        return bytecode
+    
+    def test_parse(self):
+        """
+        .parse() should split tagged bytecode file names
+        """
+        
+        self.assertEqual(cache.parse('a.b.cpython-311.opt-2.tag.pyc', ['tag']), ('a.b', 'cpython-311', 'tag'))
+        self.assertEqual(cache.parse('a.cpython-311.tag.pyc', ['other', 'tag']), ('a', 'cpython-311', 'tag'))
+        self.assertIsNone(cache.parse('a.cpython-311.pyc', ['tag']))
+        self.assertIsNone(cache.parse('tag.pyc', ['tag']))
+    
+    def test_scan(self):
+        """
+        .scan() should classify the tagged bytecode
+        """
+        
+        entries = cache.scan([self.directory], workers = 2)
+        self.assertEqual({path: status for path, status, size, source_directory in entries}, {path: status for status, path in self.paths.items()})
+        self.assertEqual(dict(cache.summarise(entries)[cache.CURRENT]), {'files': 1, 'bytes': 16})
+    
+    def test_delete(self):
+        """
+        .delete() should only delete stale bytecode that is still stale
+        """
+        
+        entries = cache.scan([self.directory])
+        # rewritten by the current compiler since
+        self.write('stale', CacheCompiler)
+        
+        deleted = cache.delete(entries, statuses = (cache.STALE_MAGIC, cache.ORPHANED))
+        self.assertEqual({entry[1] for entry in deleted}, {cache.ORPHANED})
+        self.assertEqual(sorted(os.listdir(self.pycache)), sorted([
+            os.path.basename(self.paths[cache.CURRENT]),
+            os.path.basename(self.paths[cache.STALE_MAGIC]),
+            os.path.basename(self.paths[cache.WRONG_VERSION]),
+            'current.{}.pyc'.format(sys.implementation.cache_tag),
+        ]))
+    
+    def test_main(self):
+        """
+        the command line should report and delete stale bytecode
+        """
+        
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            cache.main([self.directory, '--delete', '--json'])
+        result = json.loads(output.getvalue())
+        
+        self.assertEqual(result['scanned'][cache.CURRENT]['files'], 1)
+        self.assertEqual(result['deleted'][cache.CURRENT]['files'], 0)
+        self.assertEqual(result['deleted'][cache.WRONG_VERSION]['files'], 1)
+        self.assertTrue(os.path.exists(self.paths[cache.CURRENT]))
+        self.assertFalse(os.path.exists(self.paths[cache.STALE_MAGIC]))
+        
+        with mock.patch.object(Finder, '_registry', {}), contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                cache.main([self.directory])
+    
+    def test_scan_cache_dir(self):
+        """
+        .scan() should find the bytecode kept in a cache directory
+        """
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(self.directory, 'current.cache-test')
+            list(Loader.precompile([path], compiler = CacheCompiler, cache_dir = cache_dir))
+            bytecode = Loader('current', path, compiler = CacheCompiler, cache_dir = cache_dir).cache_path()
+            orphan = os.path.join(os.path.dirname(bytecode), 'orphan.{}.cache-test.pyc'.format(sys.implementation.cache_tag))
+            with open(orphan, 'wb') as file:
+                file.write(b'\0' * 16)
+            
+            entries = cache.scan([self.directory], cache_dir = cache_dir)
+            self.assertEqual({entry[0]: entry[1] for entry in entries}, {bytecode: cache.CURRENT, orphan: cache.ORPHANED})
+            
+            cache.delete(entries)
+            self.assertEqual(os.listdir(os.path.dirname(bytecode)), [os.path.basename(bytecode)])
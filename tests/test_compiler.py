@@ -17,8 +17,10 @@ class TestCompiler(unittest.TestCase):
         for k, v in kwargs.items():
             setattr(compiler, k, v)
         
-        yield compiler
-        cm.stop()
+        try:
+            yield compiler
+        finally:
+            cm.stop()
     
     @mock.patch.object(Compiler, 'translate')
     @mock.patch.object(Compiler, 'open', return_value = sentinel.file)
@@ -72,6 +74,39 @@ class TestCompiler(unittest.TestCase):
         self.assertEqual(compiler.data, '\n'.join(lines))
         self.assertEqual(compiler.line_numbers, [0] + lineno)
     
+    @mock.patch.object(Compiler, 'translate')
+    def test_translate_many(self, translate):
+        """
+        .translate_many() should yield a separate translation for each file
+        using one compiler
+        """
+        import io
+        
+        class CountingCompiler(Compiler):
+            instances = 0
+            def __init__(self, *args):
+                type(self).instances += 1
+                super().__init__(*args)
+        
+        translate.side_effect = lambda file: enumerate(file, 1)
+        files = [io.StringIO('file #1'), io.StringIO('file #2')]
+        
+        result = list(CountingCompiler.translate_many(files))
+        self.assertEqual(CountingCompiler.instances, 1)
+        self.assertEqual([c.data for c in result], ['file #1', 'file #2'])
+    
+    def test_nodes_per_instance(self):
+        """
+        compilers should not share .nodes
+        """
+        import ast
+        
+        first, second = Compiler(), Compiler()
+        first.nodes[1] = ast.Pass()
+        self.assertEqual(second.nodes, {})
+        with self.assertRaises(TypeError):
+            Compiler.nodes[1] = ast.Pass()
+    
     def test_make_ast_tree(self):
         """
         .make_ast_tree() should return an AST tree with modified line numbers
@@ -89,6 +124,100 @@ class TestCompiler(unittest.TestCase):
                 if hasattr(node, 'lineno'):
                     self.assertEqual(node.lineno, lineno[1])
     
+    @mock.patch.object(Compiler, 'translate')
+    def test_make_ast_tree_nodes(self, translate):
+        """
+        .make_ast_tree() should use ast nodes yielded by .translate
+        keeping their line numbers, without parsing if there are only nodes
+        """
+        import ast
+        import io
+        
+        node = ast.Expr(ast.Call(ast.Name('f', ast.Load()), [], []), col_offset = 0)
+        translate.return_value = [(3, node)]
+        compiler = Compiler(io.StringIO())
+        
+        with mock.patch('ast.parse') as parse:
+            result = compiler.make_ast_tree()
+        self.assertFalse(parse.called)
+        self.assertEqual(result.body, [node])
+        self.assertEqual(node.value.lineno, 3)
+        
+        # mixed with python
+        node = ast.Expr(ast.Name('x', ast.Load()), col_offset = 4)
+        translate.return_value = [(1, 'if True:'), (2, node), (4, 'y')]
+        compiler = Compiler(io.StringIO())
+        
+        result = compiler.make_ast_tree()
+        self.assertIs(result.body[0].body[0], node)
+        self.assertEqual([n.lineno for n in result.body], [1, 4])
+        self.assertEqual(node.lineno, 2)
+        self.assertEqual(compiler.get_source(line_numbers = False), 'if True:\n    x\ny')
+        exec(compile(result, '<string>', 'exec'), {'x': 1, 'y': 2})
+    
+    @mock.patch.object(Compiler, 'translate')
+    def test_make_code(self, translate):
+        """
+        .make_code() should give the same line numbers
+        whether they are fixed in the code objects or the AST
+        """
+        import io
+        import sys
+        import types
+        
+        lines = ['def f(x):', '    return (x +', '        1)', 'y = [f(i)', '  for i in range(3)]']
+        translate.return_value = zip([2, 4, 4, 7, 9], lines)
+        compiler = Compiler(io.StringIO())
+        
+        def positions(code):
+            result = [(code.co_firstlineno, list(code.co_positions()))]
+            for c in code.co_consts:
+                if isinstance(c, types.CodeType):
+                    result.extend(positions(c))
+            return result
+        
+        with mock.patch.object(Compiler, 'remap_code', False):
+            expected = positions(compiler.make_code())
+        
+        if sys.version_info >= (3, 11):
+            with mock.patch.object(Compiler, 'remap_code', True):
+                self.assertEqual(positions(compiler.make_code()), expected)
+    
+    @mock.patch('linecache.getline')
+    def test_make_code_error(self, getline):
+        """
+        .make_code() should point syntax errors to the original line
+        """
+        
+        src = ['x = 1', 'some invalid python']
+        lineno = [0, 3, 4]
+        getline.return_value = 'line in file'
+        
+        with self.make_compiler(data = '\n'.join(src), line_numbers = lineno, nodes = {}) as compiler:
+            with self.assertRaises(SyntaxError) as cm:
+                compiler.make_code()
+            self.assertEqual(cm.exception.args[1][1], 4)
+    
+    @mock.patch.object(Compiler, 'translate')
+    def test_passes(self, translate):
+        """
+        .make_ast_tree() and .make_code() should run the tree through .passes
+        """
+        import ast
+        import io
+        from import_anything import passes
+        
+        translate.return_value = [(1, "x = 'a' + 'b'")]
+        compiler = Compiler(io.StringIO())
+        
+        with mock.patch.object(Compiler, 'passes', (passes.FoldStrings,)):
+            result = compiler.make_ast_tree()
+            self.assertEqual(ast.unparse(result), "x = 'ab'")
+            
+            with mock.patch.object(passes.FoldStrings, 'visit', side_effect = lambda tree: tree) as visit:
+                compiler.make_code()
+            self.assertTrue(visit.called)
+    
     @mock.patch('linecache.getline')
     def test_make_ast_tree_error(self, getline):
         """
@@ -132,3 +261,37 @@ class TestCompiler(unittest.TestCase):
             result = compiler.get_source(original_numbers = True)
             for ln, res, expected in zip(lineno[1:], result.split('\n'), src):
                 self.assertRegex(res, '{} {}'.format(ln, expected))
+    
+    @mock.patch.object(Compiler, 'dump')
+    @mock.patch.object(Compiler, 'translate', return_value = [(1, 'line #1')])
+    @mock.patch.object(Compiler, 'open')
+    def test__init__dump(self, open, translate, dump):
+        """
+        the constructor should only dump the source when there is a dump_dir
+        """
+        
+        with mock.patch.object(Compiler, 'dump_dir', None):
+            Compiler('path')
+        self.assertFalse(dump.called)
+        
+        with mock.patch.object(Compiler, 'dump_dir', 'dir'):
+            Compiler('path')
+        dump.assert_called_once_with()
+    
+    def test_dump(self):
+        """
+        .dump() should write the source with original line numbers into dump_dir
+        """
+        import os
+        import tempfile
+        
+        src = ['line #1', 'line #2']
+        lineno = [0, 3, 4]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'module.ext')
+            with self.make_compiler(path, data = '\n'.join(src), line_numbers = lineno, dump_dir = directory) as compiler:
+                compiler.dump()
+                
+                name = os.path.abspath(path).lstrip(os.sep).replace(os.sep, '.') + '.py'
+                with open(os.path.join(directory, name)) as file:
+                    self.assertEqual(file.read(), compiler.get_source(original_numbers = True) + '\n')
@@ -0,0 +1,41 @@
+import unittest
+import unittest.mock as mock
+from unittest.mock import sentinel
+from import_anything.dependencies import Dependencies
+
+class TestDependencies(unittest.TestCase):
+    def test_find_imports(self):
+        """
+        .find_imports() should find absolute, relative and nested imports
+        """
+        
+        source = '\n'.join([
+            'import a.b',
+            'from c import d, e',
+            'from . import f',
+            'from .. import g',
+            'def function():',
+            '    from .h import i',
+        ])
+        code = compile(source, 'path', 'exec')
+        
+        result = Dependencies.find_imports(code, 'pkg.sub')
+        self.assertEqual(result, {
+            'a.b', 'c', 'c.d', 'c.e',
+            'pkg.sub', 'pkg.sub.f', 'pkg', 'pkg.g',
+            'pkg.sub.h', 'pkg.sub.h.i',
+        })
+    
+    def test_dependents_of(self):
+        """
+        .dependents_of() should return the modules importing a module
+        """
+        
+        dependencies = Dependencies()
+        dependencies.record('parent', compile('import child', 'path', 'exec'))
+        dependencies.record('grandparent', compile('import parent', 'path', 'exec'))
+        dependencies.record('unrelated', compile('import os', 'path', 'exec'))
+        
+        self.assertEqual(dependencies.dependents_of('child'), {'parent', 'grandparent'})
+        self.assertEqual(dependencies.dependents_of('child', transitive = False), {'parent'})
+        self.assertEqual(dependencies.dependents_of('grandparent'), set())
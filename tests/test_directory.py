@@ -0,0 +1,81 @@
+import unittest
+import unittest.mock as mock
+from unittest.mock import sentinel
+from import_anything.directory import Directory
+
+import os
+import tempfile
+
+class TestDirectory(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        
+        self.first = mock.Mock(return_value = sentinel.first)
+        self.second = mock.Mock(return_value = sentinel.second)
+        self.directory = Directory(self.path, [(self.first, ['.a', '.b.c']), (self.second, ['.c', '_d'])])
+    
+    def touch(self, *names):
+        for name in names:
+            path = os.path.join(self.path, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            open(path, 'w').close()
+        # the listing is only read again when the mtime changes
+        self.directory.invalidate_caches()
+    
+    def test_find_spec(self):
+        """
+        .find_spec() should find modules by any suffix, the earlier suffixes first
+        """
+        
+        self.touch('one.c', 'one.b.c', 'two.c', 'three_d', '.hidden.a', 'other.txt')
+        
+        spec = self.directory.find_spec('package.one')
+        self.assertEqual(spec.loader, sentinel.first)
+        self.assertEqual(spec.origin, os.path.join(self.path, 'one.b.c'))
+        self.first.assert_called_once_with('package.one', spec.origin)
+        self.assertIsNone(spec.submodule_search_locations)
+        
+        self.assertEqual(self.directory.find_spec('two').loader, sentinel.second)
+        self.assertEqual(self.directory.find_spec('three').loader, sentinel.second)
+        for missing in ['one.b', 'other', '', 'hidden']:
+            self.assertIsNone(self.directory.find_spec(missing))
+    
+    def test_find_spec_package(self):
+        """
+        .find_spec() should prefer packages to modules to namespace portions
+        """
+        
+        self.touch('package/__init__.c', 'package.a', 'module.a', 'namespace/other.a', 'module/other.a')
+        
+        spec = self.directory.find_spec('package')
+        self.assertEqual(spec.origin, os.path.join(self.path, 'package', '__init__.c'))
+        self.assertEqual(spec.submodule_search_locations, [os.path.join(self.path, 'package')])
+        
+        self.assertEqual(self.directory.find_spec('module').origin, os.path.join(self.path, 'module.a'))
+        
+        spec = self.directory.find_spec('namespace')
+        self.assertIsNone(spec.loader)
+        self.assertEqual(spec.submodule_search_locations, [os.path.join(self.path, 'namespace')])
+    
+    def test_refresh(self):
+        """
+        the listing should be read again only when the directory changes
+        """
+        
+        self.assertIsNone(self.directory.find_spec('module'))
+        open(os.path.join(self.path, 'module.a'), 'w').close()
+        os.utime(self.path, ns = (0, 0))
+        self.assertIsNotNone(self.directory.find_spec('module'))
+        
+        with mock.patch('os.scandir') as scandir:
+            self.directory.find_spec('module')
+            self.assertFalse(scandir.called)
+    
+    def test_missing(self):
+        """
+        a directory that doesn't exist has no modules
+        """
+        
+        self.assertIsNone(Directory(os.path.join(self.path, 'missing'), [(self.first, ['.a'])]).find_spec('module'))
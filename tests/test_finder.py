@@ -16,11 +16,13 @@ class TestFinder(unittest.TestCase):
         """
         
         import sys
+        import importlib.machinery
         self.assertIn(Finder, sys.meta_path)
+        self.assertGreater(sys.meta_path.index(Finder), sys.meta_path.index(importlib.machinery.PathFinder))
     
-    def test_find_module(self):
+    def test_find_spec(self):
         """
-        .find_module should find the right loader
+        .find_spec should find the right loader
         """
         
         path = [os.path.join(self.module_dir(), 'resources')]
@@ -28,6 +30,379 @@ class TestFinder(unittest.TestCase):
         
         loader_cls = mock.Mock(return_value = sentinel.loader)
         Finder.register(loader_cls, ['.extension'])
+        self.addCleanup(Finder.unregister, suffixes = ['.extension'])
         
-        result = Finder.find_module(fullname, path)
-        self.assertEqual(sentinel.loader, result)
+        result = Finder.find_spec(fullname, path)
+        self.assertEqual(sentinel.loader, result.loader)
+        self.assertEqual(result.origin, os.path.join(path[0], 'file.extension'))
+        self.assertTrue(result.has_location)
+    
+    def test_find_spec_cached(self):
+        """
+        .find_spec should set the path of the tagged bytecode
+        """
+        import tempfile
+        from import_anything import Loader
+        
+        compiler = mock.Mock(MAGIC = None, MAGIC_TAG = 'tag')
+        Finder.register(Loader.factory(compiler = compiler), ['.cached-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.cached-test'])
+        
+        with tempfile.TemporaryDirectory() as directory:
+            open(os.path.join(directory, 'file.cached-test'), 'w').close()
+            result = Finder.find_spec('file', [directory])
+        self.assertEqual(result.cached, result.loader.cache_path())
+        self.assertTrue(result.cached.endswith('.tag.pyc'))
+    
+    def test_register_priority(self):
+        """
+        .register() should give overlapping suffixes to the higher priority loader
+        """
+        
+        low, high, newest = mock.Mock(), mock.Mock(), mock.Mock()
+        self.addCleanup(Finder.unregister, suffixes = ['.priority-a', '.priority-b'])
+        
+        Finder.register(high, ['.priority-a'], priority = 10)
+        Finder.register(low, ['.priority-a', '.priority-b'])
+        self.assertIs(Finder.loader_for('.priority-a'), high)
+        self.assertIs(Finder.loader_for('.priority-b'), low)
+        self.assertLess(Finder._details.index((high, ['.priority-a'])), Finder._details.index((low, ['.priority-b'])))
+        
+        Finder.register(newest, ['.priority-b'])
+        self.assertIs(Finder.loader_for('.priority-b'), newest)
+    
+    def test_unregister(self):
+        """
+        .unregister() should remove a loader or suffixes
+        """
+        
+        loader = mock.Mock()
+        Finder.register(loader, ['.unregister-a', '.unregister-b', '.unregister-c'])
+        self.addCleanup(Finder.unregister, loader)
+        
+        Finder.unregister(suffixes = ['.unregister-a'])
+        self.assertIsNone(Finder.loader_for('.unregister-a'))
+        self.assertIs(Finder.loader_for('.unregister-b'), loader)
+        
+        Finder.unregister(loader)
+        self.assertIsNone(Finder.loader_for('.unregister-b'))
+        self.assertIsNone(Finder.loader_for('.unregister-c'))
+        self.assertNotIn(loader, [l for l, suffixes in Finder._details])
+    
+    def test_negative_cache(self):
+        """
+        .find_spec() should remember modules that weren't found
+        until the directory changes or caches are invalidated
+        """
+        import tempfile
+        
+        loader_cls = mock.Mock(return_value = sentinel.loader)
+        Finder.register(loader_cls, ['.negative-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.negative-test'])
+        
+        with tempfile.TemporaryDirectory() as directory:
+            info = Finder.negative_cache_info()
+            self.assertIsNone(Finder.find_spec('missing', [directory]))
+            self.assertIsNone(Finder.find_spec('missing', [directory]))
+            result = Finder.negative_cache_info()
+            self.assertEqual((result['hits'] - info['hits'], result['misses'] - info['misses']), (1, 1))
+            
+            with mock.patch.object(Finder, '_finder') as finder:
+                self.assertIsNone(Finder.find_spec('missing', [directory]))
+                self.assertFalse(finder.called)
+            
+            open(os.path.join(directory, 'missing.negative-test'), 'w').close()
+            os.utime(directory, ns = (0, 0))
+            self.assertEqual(Finder.find_spec('missing', [directory]).loader, sentinel.loader)
+            
+            self.assertIsNone(Finder.find_spec('other', [directory]))
+            Finder.invalidate_caches()
+            self.assertEqual(Finder.negative_cache_info()['size'], 0)
+    
+    def test_import_package(self):
+        """
+        a directory with a custom __init__ should be imported as a
+        package, not as a namespace package by the stdlib PathFinder
+        """
+        import sys
+        import tempfile
+        from import_anything import Compiler, Loader
+        
+        Finder.register(Loader.factory(compiler = Compiler), ['.package-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.package-test'])
+        
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'custom_package'))
+            with open(os.path.join(directory, 'custom_package', '__init__.package-test'), 'w') as file:
+                file.write('y = 1\n')
+            with open(os.path.join(directory, 'custom_package', 'module.package-test'), 'w') as file:
+                file.write('z = 2\n')
+            
+            sys.path.insert(0, directory)
+            self.addCleanup(sys.path.remove, directory)
+            self.addCleanup(sys.modules.pop, 'custom_package', None)
+            self.addCleanup(sys.modules.pop, 'custom_package.module', None)
+            
+            import custom_package.module
+            self.assertEqual(custom_package.y, 1)
+            self.assertIsInstance(custom_package.__loader__, Loader)
+            self.assertEqual(custom_package.module.z, 2)
+    
+    def test_import_python_first(self):
+        """
+        python modules should be left to the stdlib,
+        wherever they are on the path
+        """
+        import sys
+        import tempfile
+        import importlib
+        import importlib.machinery
+        from import_anything import Compiler, Loader
+        
+        Finder.register(Loader.factory(compiler = Compiler), ['.order-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.order-test'])
+        
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            with open(os.path.join(first, 'order_module.order-test'), 'w') as file:
+                file.write('x = 1\n')
+            with open(os.path.join(second, 'order_module.py'), 'w') as file:
+                file.write('x = 2\n')
+            
+            sys.path[:0] = [first, second]
+            self.addCleanup(sys.path.remove, first)
+            self.addCleanup(sys.path.remove, second)
+            self.addCleanup(sys.modules.pop, 'order_module', None)
+            
+            with mock.patch.object(Finder, 'find_spec') as find_spec:
+                module = importlib.import_module('order_module')
+                self.assertFalse(find_spec.called)
+            self.assertEqual(module.x, 2)
+            self.assertIsInstance(module.__loader__, importlib.machinery.SourceFileLoader)
+    
+    def test_find_spec_namespace(self):
+        """
+        .find_spec() should return a namespace package spec with all portions
+        """
+        import tempfile
+        
+        Finder.register(mock.Mock(), ['.extension'])
+        self.addCleanup(Finder.unregister, suffixes = ['.extension'])
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            for directory in (first, second):
+                os.mkdir(os.path.join(directory, 'namespace'))
+            
+            result = Finder.find_spec('namespace', [first, second])
+            self.assertIsNone(result.loader)
+            self.assertEqual(list(result.submodule_search_locations), [
+                os.path.join(first, 'namespace'),
+                os.path.join(second, 'namespace'),
+            ])
+    
+    def test_import_namespace(self):
+        """
+        custom modules should be imported from namespace packages,
+        including portions added to sys.path after the import
+        """
+        import sys
+        import tempfile
+        import importlib
+        from import_anything import Compiler, Loader
+        
+        Finder.register(Loader.factory(compiler = Compiler), ['.namespace-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.namespace-test'])
+        
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            for directory, name in ((first, 'm1'), (second, 'm2')):
+                os.mkdir(os.path.join(directory, 'custom_namespace'))
+                with open(os.path.join(directory, 'custom_namespace', name + '.namespace-test'), 'w') as file:
+                    file.write('name = {!r}\n'.format(name))
+            
+            sys.path.insert(0, first)
+            self.addCleanup(sys.path.remove, first)
+            for name in ('custom_namespace', 'custom_namespace.m1', 'custom_namespace.m2'):
+                self.addCleanup(sys.modules.pop, name, None)
+            
+            self.assertEqual(importlib.import_module('custom_namespace.m1').name, 'm1')
+            
+            sys.path.append(second)
+            self.addCleanup(sys.path.remove, second)
+            self.assertEqual(importlib.import_module('custom_namespace.m2').name, 'm2')
+    
+    def test_finder_cached(self):
+        """
+        FileFinders should be reused for each path entry
+        """
+        
+        path = os.path.join(self.module_dir(), 'resources')
+        self.assertIs(Finder._finder(path), Finder._finder(path))
+    
+    def test_finder_register_race(self):
+        """
+        a Directory built while a loader is being registered
+        shouldn't be kept with the old details
+        """
+        import threading
+        from import_anything.directory import Directory
+        
+        path = os.path.join(self.module_dir(), 'resources')
+        Finder._finders.pop(path, None)
+        register = threading.Thread(target = Finder.register, args = (mock.Mock(), ['.race-test']))
+        self.addCleanup(Finder.unregister, suffixes = ['.race-test'])
+        
+        def build(*args):
+            register.start()
+            register.join(0.1)
+            return Directory(*args)
+        
+        with mock.patch('import_anything.finder.Directory', side_effect = build):
+            Finder._finder(path)
+        register.join()
+        self.assertNotIn(path, Finder._finders)
+    
+    def test_install_path_hook(self):
+        """
+        .install_path_hook() should find custom modules through sys.path_hooks
+        """
+        import sys
+        import tempfile
+        import importlib
+        from import_anything import Loader, Compiler
+        
+        Finder.register(Loader.factory(compiler = Compiler), ['.path-hook-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.path-hook-test'])
+        Finder.install_path_hook()
+        self.addCleanup(Finder.uninstall_path_hook)
+        self.assertNotIn(Finder, sys.meta_path)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'path_hook_module.path-hook-test'), 'w') as file:
+                file.write('x = 1\n')
+            
+            sys.path.insert(0, directory)
+            self.addCleanup(sys.path.remove, directory)
+            self.addCleanup(sys.modules.pop, 'path_hook_module', None)
+            
+            with mock.patch.object(Finder, 'find_spec') as find_spec:
+                module = importlib.import_module('path_hook_module')
+                self.assertFalse(find_spec.called)
+            self.assertEqual(module.x, 1)
+            self.assertIsInstance(module.__loader__, Loader)
+        
+        Finder.uninstall_path_hook()
+        self.assertIn(Finder, sys.meta_path)
+
+class TestFinderArchive(unittest.TestCase):
+    """
+    Tests for importing from zip archives
+    """
+    
+    suffix = '.archive-test'
+    
+    def setUp(self):
+        import sys
+        import tempfile
+        import zipfile
+        from import_anything import Loader, Compiler
+        
+        self.compiler = Compiler
+        Finder.register(Loader.factory(compiler = Compiler), [self.suffix])
+        self.addCleanup(Finder.unregister, suffixes = [self.suffix])
+        
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive = os.path.join(directory.name, 'archive.zip')
+        
+        with zipfile.ZipFile(self.archive, 'w') as archive:
+            archive.writestr('archived_module' + self.suffix, 'x = 1\n')
+            archive.writestr('archived_package/__init__' + self.suffix, 'y = 2\n')
+            archive.writestr('archived_package/submodule' + self.suffix, 'z = 3\n')
+        
+        sys.path.insert(0, self.archive)
+        self.addCleanup(sys.path.remove, self.archive)
+        for name in ('archived_module', 'archived_package', 'archived_package.submodule'):
+            self.addCleanup(sys.modules.pop, name, None)
+    
+    def test_import(self):
+        """
+        modules and packages should be importable from zip archives
+        """
+        
+        import archived_module
+        import archived_package.submodule
+        
+        self.assertEqual(archived_module.x, 1)
+        self.assertEqual(archived_package.y, 2)
+        self.assertEqual(archived_package.submodule.z, 3)
+        self.assertEqual(archived_module.__file__, os.path.join(self.archive, 'archived_module' + self.suffix))
+    
+    def test_source_lines(self):
+        """
+        linecache and inspect should see the source of archived modules
+        """
+        import linecache
+        import inspect
+        import archived_module
+        
+        self.assertEqual(linecache.getline(archived_module.__file__, 1), 'x = 1\n')
+        self.assertEqual(inspect.getsource(archived_module), 'x = 1\n')
+    
+    def test_archive_cached(self):
+        """
+        the archive index should only be read once
+        """
+        
+        import zipfile
+        with mock.patch('zipfile.ZipFile', wraps = zipfile.ZipFile) as ZipFile:
+            Finder.invalidate_caches()
+            Finder.find_spec('archived_module', [self.archive])
+            Finder.find_spec('archived_package', [self.archive])
+            self.assertEqual(ZipFile.call_count, 1)
+    
+    def test_archive_changed(self):
+        """
+        an archive should be reopened when it changes
+        and the old one closed
+        """
+        from import_anything.archive import Archive
+        
+        old, prefix = Archive.find(self.archive)
+        path = os.path.join(self.archive, 'archived_module' + self.suffix)
+        self.assertEqual(old.read(path), b'x = 1\n')
+        
+        os.utime(self.archive, (0, 0))
+        new, prefix = Archive.find(self.archive)
+        self.assertIsNot(new, old)
+        self.assertIsNone(old.zipfile.fp)
+        self.assertEqual(new.read(path), b'x = 1\n')
+        with self.assertRaises(OSError):
+            old.read(path)
+    
+    def test_bytecode(self):
+        """
+        tagged bytecode inside archives should be used
+        """
+        import sys
+        import tempfile
+        import zipfile
+        import importlib.util
+        from import_anything import Loader
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'compiled_module' + self.suffix)
+            with open(path, 'w') as file:
+                file.write('x = 1\n')
+            list(Loader.precompile([path], compiler = self.compiler))
+            
+            archive = os.path.join(directory, 'compiled.zip')
+            with zipfile.ZipFile(archive, 'w') as zip:
+                for i in (path, importlib.util.cache_from_source(path)):
+                    zip.write(i, os.path.relpath(i, directory))
+            
+            sys.path.insert(0, archive)
+            self.addCleanup(sys.path.remove, archive)
+            self.addCleanup(sys.modules.pop, 'compiled_module', None)
+            
+            with mock.patch.object(self.compiler, 'load') as load:
+                import compiled_module
+                self.assertFalse(load.called)
+            self.assertEqual(compiled_module.x, 1)
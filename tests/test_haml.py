@@ -0,0 +1,40 @@
+import io
+import unittest
+from import_anything import Finder
+
+class TestHamlCompiler(unittest.TestCase):
+    """
+    Tests for the Haml example's compiler
+    """
+    
+    def setUp(self):
+        from examples.haml.import_haml import HamlCompiler
+        
+        # importing the example registers it for .haml
+        self.addCleanup(Finder.unregister, suffixes = ['.haml'])
+        self.compiler = HamlCompiler
+    
+    def translate(self, source):
+        return self.compiler(io.StringIO(source)).data
+    
+    def test_cache(self):
+        """
+        '- cache [arguments]:' should start a cached fragment
+        """
+        
+        for line in ['- cache key, ttl = 60:', '- cache:', '- cache  key :']:
+            data = self.translate(line + '\n  %p cached\n')
+            self.assertIn('__stack.cache_fragment(', data, line)
+        
+        data = self.translate('- cache key, ttl = 60:\n  %p cached\n')
+        self.assertIn(', key, ttl = 60)', data)
+    
+    def test_cache_python(self):
+        """
+        python lines that start with 'cache' should be left as they are
+        """
+        
+        for line in ['- cache.items():', '- cache[key]:', '- cache_key = 1']:
+            data = self.translate(line + '\n')
+            self.assertNotIn('__stack.cache_fragment(', data, line)
+            self.assertIn(line[2:], data)
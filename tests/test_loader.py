@@ -1,7 +1,9 @@
+import sys
 import unittest
 import unittest.mock as mock
 from unittest.mock import sentinel
 from import_anything import Loader, Compiler
+from import_anything.loader import HEADER_SIZE
 
 def default_loader():
     compiler = mock.Mock()
@@ -11,19 +13,17 @@ def default_loader():
     return Loader('filename', 'path', compiler = compiler)
 
 class TestLoader(unittest.TestCase):
-    @mock.patch('builtins.compile')
-    def test_source_to_code_compiled(self, compile):
+    def test_source_to_code_compiled(self):
         """
         .source_to_code() should compile a code object
         when re-compiling
         """
         
-        compile.return_value = sentinel.code
-        
         loader = default_loader()
+        loader.compiler.make_code.return_value = sentinel.code
         result = loader.source_to_code(None, sentinel.path)
         
-        compile.assert_called_once_with(loader.compiler.make_ast_tree(), sentinel.path, mock.ANY)
+        loader.compiler.make_code.assert_called_once_with(sentinel.path, optimize = sys.flags.optimize)
         self.assertIs(result, sentinel.code)
     
     @mock.patch('importlib.machinery.SourceFileLoader.path_stats')
@@ -40,6 +40,200 @@ class TestLoader(unittest.TestCase):
         super_path_stats.assert_called_once_with('some path')
         self.assertEqual(loader._size, sentinel.size)
 
+    def test_precompile(self):
+        """
+        .precompile() should write bytecode that is later loaded
+        without translating again
+        """
+        import os
+        import tempfile
+        import importlib.util
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'module.ext')
+            with open(path, 'w') as file:
+                file.write('x = 1\n')
+            
+            result = list(Loader.precompile([path], compiler = Compiler))
+            self.assertEqual(result, [path])
+            self.assertTrue(os.path.exists(importlib.util.cache_from_source(path)))
+            
+            loader = Loader('module', path, compiler = Compiler)
+            with mock.patch.object(Compiler, 'load') as load:
+                namespace = {}
+                exec(loader.get_code('module'), namespace)
+                self.assertFalse(load.called)
+            self.assertEqual(namespace['x'], 1)
+
+    def test_precompile_tagged(self):
+        """
+        .precompile() should write the bytecode of tagged compilers
+        where it is loaded from
+        """
+        import os
+        import tempfile
+        
+        class TaggedCompiler(Compiler):
+            MAGIC = 1
+            MAGIC_TAG = 'tagged'
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'module.ext')
+            with open(path, 'w') as file:
+                file.write('x = 1\n')
+            
+            list(Loader.precompile([path], compiler = TaggedCompiler))
+            loader = Loader('module', path, compiler = TaggedCompiler)
+            self.assertTrue(loader.cache_path().endswith('.tagged.pyc'))
+            self.assertTrue(os.path.exists(loader.cache_path()))
+            self.assertEqual(loader.bytecode_path(loader.cache_path()), loader.cache_path())
+    
+    def test_optimize(self):
+        """
+        the optimization level should be used to compile
+        and kept apart in the cached bytecode
+        """
+        import os
+        import tempfile
+        import importlib.util
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'module.ext')
+            with open(path, 'w') as file:
+                file.write('"""docstring"""\nassert False\n')
+            
+            list(Loader.precompile([path], compiler = Compiler, optimize = 2))
+            self.assertTrue(os.path.exists(importlib.util.cache_from_source(path, optimization = 2)))
+            self.assertFalse(os.path.exists(importlib.util.cache_from_source(path, optimization = '')))
+            
+            loader = Loader('module', path, compiler = Compiler, optimize = 2)
+            self.assertEqual(loader.cache_path(), importlib.util.cache_from_source(path, optimization = 2))
+            with mock.patch.object(Compiler, 'load') as load:
+                namespace = {}
+                exec(loader.get_code('module'), namespace)
+                self.assertFalse(load.called)
+            self.assertNotIn('__doc__', namespace)
+            
+            loader = Loader('module', path, compiler = Compiler, optimize = 0)
+            with self.assertRaises(AssertionError):
+                exec(loader.get_code('module'), {})
+    
+    def test_cache_dir(self):
+        """
+        bytecode should be written to and read from cache_dir,
+        or sys.pycache_prefix, instead of next to the source
+        """
+        import os
+        import tempfile
+        import importlib.util
+        
+        with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(directory, 'module.ext')
+            with open(path, 'w') as file:
+                file.write('x = 1\n')
+            
+            loader = Loader('module', path, compiler = Compiler, cache_dir = cache_dir)
+            expected = os.path.join(cache_dir, directory.lstrip(os.sep), os.path.basename(importlib.util.cache_from_source(path)))
+            self.assertEqual(loader.cache_path(), expected)
+            
+            with mock.patch.object(sys, 'dont_write_bytecode', False):
+                exec(loader.get_code('module'), {})
+            self.assertTrue(os.path.exists(expected))
+            self.assertFalse(os.path.exists(os.path.join(directory, '__pycache__')))
+            
+            loader = Loader('module', path, compiler = Compiler, cache_dir = cache_dir)
+            with mock.patch.object(Compiler, 'load') as load:
+                namespace = {}
+                exec(loader.get_code('module'), namespace)
+                self.assertFalse(load.called)
+            self.assertEqual(namespace['x'], 1)
+            
+            with mock.patch.object(sys, 'pycache_prefix', cache_dir):
+                loader = Loader('module', path, compiler = Compiler)
+                self.assertEqual(loader.cache_path(), expected)
+    
+    def test_store(self):
+        """
+        code should be shared through the store between
+        copies of the same source in different places
+        """
+        import os
+        import tempfile
+        from import_anything.store import DirectoryStore
+        
+        with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as store_dir:
+            store = DirectoryStore(store_dir)
+            paths = []
+            for name in ['a', 'b', 'c']:
+                os.mkdir(os.path.join(directory, name))
+                paths.append(os.path.join(directory, name, 'module.ext'))
+                with open(paths[-1], 'w') as file:
+                    file.write('def f():\n    return 1\n')
+            
+            loader = Loader('module', paths[0], compiler = Compiler, store = store)
+            exec(loader.get_code('module'), {})
+            
+            loader = Loader('module', paths[1], compiler = Compiler, store = store)
+            with mock.patch.object(Compiler, 'load') as load:
+                namespace = {}
+                exec(loader.get_code('module'), namespace)
+                self.assertFalse(load.called)
+            self.assertEqual(namespace['f'](), 1)
+            self.assertEqual(namespace['f'].__code__.co_filename, paths[1])
+            
+            with mock.patch.object(Compiler, 'translate_many') as translate_many:
+                translate_many.return_value = iter([])
+                self.assertEqual(list(Loader.precompile([paths[2]], compiler = Compiler, store = store)), [paths[2]])
+                translate_many.assert_called_once_with([])
+            self.assertTrue(Loader('module', paths[2], compiler = Compiler).cache_is_current())
+            
+            # a different source isn't found
+            with open(paths[2], 'w') as file:
+                file.write('x = 2\n')
+            loader = Loader('module', paths[2], compiler = Compiler, store = store)
+            self.assertIsNone(loader.stored_code(loader.optimize))
+    
+    def test_fix_co_filename(self):
+        """
+        fix_co_filename() should set the filename of nested
+        code objects too, without _imp._fix_co_filename
+        """
+        import _imp
+        from import_anything.loader import fix_co_filename
+        
+        for imp in (_imp, mock.Mock(spec = [])):
+            code_object = compile('def f():\n    return 1\n', 'old.ext', 'exec')
+            with mock.patch('import_anything.loader._imp', imp):
+                code_object = fix_co_filename(code_object, 'new.ext')
+            
+            namespace = {}
+            exec(code_object, namespace)
+            self.assertEqual(code_object.co_filename, 'new.ext')
+            self.assertEqual(namespace['f'].__code__.co_filename, 'new.ext')
+    
+    def test_get_source(self):
+        """
+        .get_source() should return the original source or,
+        when asked, the translated source
+        """
+        import os
+        import tempfile
+        
+        class UpperCompiler(Compiler):
+            def translate(self, file):
+                for lineno, line in enumerate(file, 1):
+                    yield lineno, line.upper().rstrip('\n')
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'module.ext')
+            with open(path, 'w') as file:
+                file.write('x = 1\n')
+            
+            loader = Loader('module', path, compiler = UpperCompiler)
+            self.assertEqual(loader.get_source('module'), 'x = 1\n')
+            self.assertEqual(loader.get_source('module', translated = True), 'X = 1')
+            self.assertIsNone(loader._compiler)
+
 class TestLoaderGetData(unittest.TestCase):
     """
     Tests for Loader.get_data()
@@ -76,9 +270,9 @@ class TestLoaderGetData(unittest.TestCase):
         self.super_get_data.assert_called_once_with(self.path)
         
         self.assertIsInstance(result, bytes)
-        self.assertEqual(result[:8], self.data[:8])
-        self.assertEqual(result[8:12], self.size.to_bytes(4, 'little'))
-        self.assertEqual(result[12:], self.data[12:])
+        self.assertEqual(result[:HEADER_SIZE - 4], self.data[:HEADER_SIZE - 4])
+        self.assertEqual(result[HEADER_SIZE - 4:HEADER_SIZE], self.size.to_bytes(4, 'little'))
+        self.assertEqual(result[HEADER_SIZE:], self.data[HEADER_SIZE:])
         
     def test_with_magic(self):
         """
@@ -145,7 +339,7 @@ class TestLoadSetData(unittest.TestCase):
         import marshal
         
         result = self.loader.set_data(self.path, self.data)
-        self.super_set_data.assert_called_once_with(self.path, self.data[:12] + marshal.dumps(self.code))
+        self.super_set_data.assert_called_once_with(self.path, self.data[:HEADER_SIZE] + marshal.dumps(self.code))
         self.assertIs(result, sentinel.super_result)
     
     def test_with_magic(self):
@@ -197,12 +391,10 @@ class TestLoaderApplyCompilerMagic(unittest.TestCase):
         """
         .apply_compiler_magic() should xor magic to data
         """
-        import ctypes
-        
         compiler_magic = 10
         
         magic_data = int.from_bytes(self.data[:2], 'little') ^ compiler_magic
-        magic_data = ctypes.c_uint16(magic_data).value.to_bytes(2, 'little')
+        magic_data = (magic_data & 0xFFFF).to_bytes(2, 'little')
         magic_data = magic_data + self.data[2:]
         
         self.loader._compiler_cls.MAGIC = compiler_magic
@@ -242,3 +434,141 @@ class TestLoaderApplyCompilerMagicTag(unittest.TestCase):
         
         result = self.loader.apply_compiler_magic_tag(self.path)
         self.assertEqual(result, magic_path)
+
+
+class TestLoaderThreads(unittest.TestCase):
+    """
+    Tests for importing from several threads at once
+    """
+    
+    suffix = '.thread-test'
+    count = 200
+    
+    def setUp(self):
+        import os
+        import sys
+        import tempfile
+        import import_anything
+        
+        import_anything.Finder.register(Loader.factory(compiler = Compiler), [self.suffix])
+        self.addCleanup(import_anything.Finder.unregister, suffixes = [self.suffix])
+        
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        sys.path.insert(0, directory.name)
+        self.addCleanup(sys.path.remove, directory.name)
+        
+        # files of different sizes, so mixing up sizes between threads shows
+        self.names = []
+        for i in range(self.count):
+            name = 'threaded_module_{}'.format(i)
+            with open(os.path.join(directory.name, name + self.suffix), 'w') as file:
+                file.write('value = {!r}\n'.format('x' * i))
+            self.names.append(name)
+            self.addCleanup(sys.modules.pop, name, None)
+        
+        self.dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = False
+        self.addCleanup(setattr, sys, 'dont_write_bytecode', self.dont_write_bytecode)
+    
+    def import_all(self):
+        import sys
+        import importlib
+        import concurrent.futures
+        
+        for name in self.names:
+            sys.modules.pop(name, None)
+        importlib.invalidate_caches()
+        
+        with concurrent.futures.ThreadPoolExecutor(16) as executor:
+            modules = list(executor.map(importlib.import_module, self.names))
+        
+        for i, module in enumerate(modules):
+            self.assertEqual(module.value, 'x' * i)
+        return modules
+    
+    def test_concurrent_imports(self):
+        """
+        modules should import correctly from many threads, both when
+        compiling and when loading the cached bytecode
+        """
+        
+        # compile and write bytecode
+        self.import_all()
+        
+        # load the bytecode; must not recompile
+        with mock.patch.object(Compiler, 'load') as load:
+            self.import_all()
+            self.assertFalse(load.called)
+    
+    def test_shared_loader(self):
+        """
+        .path_stats() sizes should not leak between threads
+        """
+        import threading
+        
+        loader = default_loader()
+        barrier = threading.Barrier(2)
+        sizes = {}
+        
+        def run(size):
+            loader.path_stats(size)
+            barrier.wait()
+            sizes[size] = loader._size
+        
+        with mock.patch('importlib.machinery.SourceFileLoader.path_stats', side_effect = lambda size: dict(size = size)):
+            threads = [threading.Thread(target = run, args = (i,)) for i in (1, 2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sizes, {1: 1, 2: 2})
+
+
+class TestLoaderMemory(unittest.TestCase):
+    """
+    Tests for memory held by loaders after import
+    """
+    
+    suffix = '.memory-test'
+    
+    def test_release(self):
+        """
+        loaders should not keep the translation alive after exec_module
+        """
+        import os
+        import sys
+        import gc
+        import tempfile
+        import importlib
+        import tracemalloc
+        import import_anything
+        
+        import_anything.Finder.register(Loader.factory(compiler = Compiler), [self.suffix])
+        self.addCleanup(import_anything.Finder.unregister, suffixes = [self.suffix])
+        
+        with tempfile.TemporaryDirectory() as directory:
+            # lots of source but hardly any code
+            source = ''.join('# {}\n'.format('x' * 100) for i in range(10000)) + 'x = 1\n'
+            with open(os.path.join(directory, 'large_module' + self.suffix), 'w') as file:
+                file.write(source)
+            
+            sys.path.insert(0, directory)
+            self.addCleanup(sys.path.remove, directory)
+            self.addCleanup(sys.modules.pop, 'large_module', None)
+            
+            gc.collect()
+            tracemalloc.start()
+            self.addCleanup(tracemalloc.stop)
+            before = tracemalloc.get_traced_memory()[0]
+            
+            module = importlib.import_module('large_module')
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - before
+            
+            self.assertIsNone(module.__loader__._compiler)
+            self.assertIsNone(module.__loader__._code_object)
+            self.assertLess(retained, len(source) / 10)
+            
+            # still available when asked for
+            self.assertIn('x = 1', module.__loader__.compiler.data)
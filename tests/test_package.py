@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import unittest
+
+class TestPackage(unittest.TestCase):
+    def imported_modules(self):
+        """
+        Returns the modules importing import_anything
+        adds to sys.modules in a fresh interpreter
+        """
+        
+        code = '\n'.join([
+            'import sys',
+            'before = set(sys.modules)',
+            'import import_anything',
+            'print("\\n".join(set(sys.modules) - before))',
+        ])
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            stdout = subprocess.PIPE, universal_newlines = True, check = True,
+            cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        return set(result.stdout.split())
+    
+    def test_imports(self):
+        """
+        importing import_anything should only load what loading
+        cached bytecode needs
+        """
+        
+        modules = self.imported_modules()
+        self.assertIn('import_anything.finder', modules)
+        
+        for module in ['import_anything.compiler', 'import_anything.reloader', 'ast', 'tokenize', 'zipfile', 'dis', 'ctypes']:
+            self.assertNotIn(module, modules)
+    
+    def test_lazy_attributes(self):
+        """
+        the lazily imported names should still be available
+        """
+        import import_anything
+        from import_anything.compiler import Compiler
+        from import_anything.dependencies import dependents_of
+        
+        self.assertIs(import_anything.Compiler, Compiler)
+        self.assertIs(import_anything.dependents_of, dependents_of)
+        self.assertIn('Reloader', dir(import_anything))
+        with self.assertRaises(AttributeError):
+            import_anything.missing
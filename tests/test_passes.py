@@ -0,0 +1,108 @@
+import ast
+import unittest
+from import_anything import passes
+
+class TestPasses(unittest.TestCase):
+    def transform(self, transformer, source):
+        tree = transformer.visit(ast.parse(source))
+        return ast.unparse(ast.fix_missing_locations(tree))
+    
+    def test_fold_strings(self):
+        """
+        FoldStrings should fold concatenated and joined string constants
+        """
+        
+        result = self.transform(passes.FoldStrings(), "x = 'a' + 'b' + 'c'\ny = ' '.join(('d', 'e' + 'f'))")
+        self.assertEqual(result, "x = 'abc'\ny = 'd ef'")
+        
+        source = "x = 'a' + b\ny = ' '.join(('d', e))\nz = 1 + 2"
+        self.assertEqual(self.transform(passes.FoldStrings(), source), ast.unparse(ast.parse(source)))
+    
+    def test_remove_dead_branches(self):
+        """
+        RemoveDeadBranches should remove code that can't run
+        """
+        
+        source = '\n'.join([
+            'def f():',
+            '    if True:',
+            '        a()',
+            '    else:',
+            '        b()',
+            '    while 0:',
+            '        c()',
+            '    if False:',
+            '        d()',
+            '    return',
+            '    e()',
+        ])
+        result = self.transform(passes.RemoveDeadBranches(), source)
+        self.assertEqual(result, 'def f():\n    a()\n    return')
+        
+        # a pass is left in empty blocks
+        result = self.transform(passes.RemoveDeadBranches(), 'if x:\n    if 0:\n        y()')
+        self.assertEqual(result, 'if x:\n    pass')
+    
+    def test_remove_dead_branches_binding(self):
+        """
+        RemoveDeadBranches should keep dead code that binds names
+        or makes a function a generator
+        """
+        
+        for dead in ['x = 1', 'yield', 'import x', 'global x', 'for x in y: pass', 'def x(): pass']:
+            source = 'def f():\n    if False:\n        {}'.format(dead)
+            self.assertEqual(self.transform(passes.RemoveDeadBranches(), source), ast.unparse(ast.parse(source)))
+    
+    def test_hoist_attributes(self):
+        """
+        HoistAttributes should load attributes used several times once
+        """
+        
+        transformer = passes.HoistAttributes(['x'])
+        source = 'def f():\n    """doc"""\n    x.a(1)\n    x.a(2)\n    x.b()\n    y.a()'
+        result = self.transform(transformer, source)
+        self.assertEqual(result, 'def f():\n    """doc"""\n    _hoisted_x_a = x.a\n    _hoisted_x_a(1)\n    _hoisted_x_a(2)\n    x.b()\n    y.a()')
+        
+        namespace = {'x': [], 'y': None}
+        code = compile(ast.fix_missing_locations(transformer.visit(ast.parse('def f():\n    x.append(1)\n    x.append(2)'))), 'path', 'exec')
+        exec(code, namespace)
+        namespace['f']()
+        self.assertEqual(namespace['x'], [1, 2])
+    
+    def test_hoist_attributes_scopes(self):
+        """
+        HoistAttributes should leave functions that bind the name alone
+        and not hoist out of nested scopes
+        """
+        
+        transformer = passes.HoistAttributes(['x'])
+        sources = [
+            'def f():\n    x.a()\n    x = 1\n    x.a()',
+            'def f(x):\n    x.a()\n    x.a()',
+            'def f():\n    x.a()\n    def g():\n        global x\n        x = 1\n    x.a()',
+            'def f():\n    g = lambda: x.a()\n    h = [x.a() for i in y]',
+            'def f():\n    @x.a\n    @x.a\n    def g():\n        pass',
+            'def f():\n    import x\n    x.a()\n    x.a()',
+            'def f():\n    import x.y\n    x.a()\n    x.a()',
+            'def f():\n    from y import x\n    x.a()\n    x.a()',
+            'def f():\n    import y as x\n    x.a()\n    x.a()',
+            'def f():\n    x.a()\n    try:\n        pass\n    except E as x:\n        pass\n    x.a()',
+            'def f():\n    x.a()\n    x.a()\n    def x():\n        pass',
+            'def f():\n    x.a()\n    x.a()\n    class x:\n        pass',
+            'def f():\n    x.a()\n    x.a()\n    x.a = 1',
+            'def f():\n    x.a()\n    x.a()\n    x.a += 1',
+            'def f():\n    x.a()\n    x.a()\n    del x.a',
+        ]
+        if hasattr(ast, 'Match'):
+            sources += [
+                'def f():\n    x.a()\n    x.a()\n    match y:\n        case [*x]:\n            pass',
+                'def f():\n    x.a()\n    x.a()\n    match y:\n        case {**x}:\n            pass',
+                'def f():\n    x.a()\n    x.a()\n    match y:\n        case z as x:\n            pass',
+                'def f():\n    x.a()\n    x.a()\n    match y:\n        case x:\n            pass',
+            ]
+        for source in sources:
+            self.assertEqual(self.transform(transformer, source), ast.unparse(ast.parse(source)))
+        
+        # only the attribute that is assigned is left alone
+        result = self.transform(transformer, 'def f():\n    x.a()\n    x.a()\n    x.b()\n    x.b()\n    x.a = 1')
+        self.assertEqual(result, 'def f():\n    _hoisted_x_b = x.b\n    x.a()\n    x.a()\n    _hoisted_x_b()\n    _hoisted_x_b()\n    x.a = 1')
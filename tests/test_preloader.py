@@ -0,0 +1,122 @@
+import unittest
+import unittest.mock as mock
+from import_anything import Compiler, Finder, Loader
+from import_anything import preloader
+
+import gc
+import os
+import sys
+import tempfile
+
+class TestPreloader(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        
+        files = {
+            'preloaded/__init__.preload-test': 'x = 1\n',
+            'preloaded/a.preload-test': 'from . import b\ny = b.z\n',
+            'preloaded/b.preload-test': 'z = 2\n',
+            'preloaded/sub/c.preload-test': 'w = 3\n',
+            'preloaded/not-a-module.preload-test': '',
+            'preloaded/other.py': '',
+        }
+        for name, source in files.items():
+            path = os.path.join(self.directory, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            with open(path, 'w') as file:
+                file.write(source)
+        
+        Finder.register(Loader.factory(compiler = Compiler), ['.preload-test'])
+        self.addCleanup(Finder.unregister, suffixes = ['.preload-test'])
+        sys.path.insert(0, self.directory)
+        self.addCleanup(sys.path.remove, self.directory)
+        self.addCleanup(self.forget_modules)
+        
+        patcher = mock.patch.object(sys, 'dont_write_bytecode', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    @staticmethod
+    def forget_modules():
+        for name in list(sys.modules):
+            if name == 'preloaded' or name.startswith('preloaded.'):
+                del sys.modules[name]
+    
+    def test_find_modules(self):
+        """
+        .find_modules() should find the custom modules in a package
+        or directories on sys.path, including subpackages
+        """
+        
+        expected = ['preloaded', 'preloaded.a', 'preloaded.b', 'preloaded.sub.c']
+        modules = preloader.find_modules([self.directory])
+        self.assertEqual([name for name, path in modules], expected)
+        self.assertEqual(modules[1][1], os.path.join(self.directory, 'preloaded', 'a.preload-test'))
+        
+        self.assertEqual(preloader.find_modules('preloaded'), modules)
+        
+        with self.assertRaises(ValueError):
+            preloader.find_modules([os.path.join(self.directory, 'preloaded')])
+    
+    def test_preload(self):
+        """
+        .preload() should compile the modules without bytecode
+        then import them all
+        """
+        
+        result = preloader.preload([self.directory], workers = 1)
+        self.assertEqual((result['modules'], result['compiled'], result['imported']), (4, 4, 4))
+        self.assertEqual(sys.modules['preloaded'].x, 1)
+        self.assertEqual(sys.modules['preloaded.a'].y, 2)
+        self.assertEqual(sys.modules['preloaded.sub.c'].w, 3)
+        self.assertIsNone(sys.modules['preloaded.a'].__loader__._compiler)
+        
+        # the bytecode is current now
+        self.forget_modules()
+        with mock.patch.object(Compiler, 'load') as load:
+            result = preloader.preload('preloaded', workers = 1)
+            self.assertFalse(load.called)
+        self.assertEqual((result['modules'], result['compiled'], result['imported']), (4, 0, 4))
+        
+        with open(os.path.join(self.directory, 'preloaded', 'b.preload-test'), 'w') as file:
+            file.write('z = 4\n')
+        os.utime(file.name, (0, 0))
+        self.forget_modules()
+        result = preloader.preload('preloaded', workers = 1)
+        self.assertEqual(result['compiled'], 1)
+        self.assertEqual(sys.modules['preloaded.a'].y, 4)
+    
+    def test_preload_shadowed(self):
+        """
+        .preload() should raise if a module isn't imported from its file
+        """
+        
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'preloaded'))
+            open(os.path.join(directory, 'preloaded', '__init__.py'), 'w').close()
+            sys.path.insert(0, directory)
+            self.addCleanup(sys.path.remove, directory)
+            
+            with self.assertRaises(ImportError):
+                preloader.preload([self.directory], workers = 1)
+    
+    def test_preload_workers(self):
+        """
+        .preload() should compile in worker processes
+        """
+        
+        result = preloader.preload([self.directory], workers = 2)
+        self.assertEqual(result['compiled'], 4)
+        for name, path in preloader.find_modules([self.directory]):
+            self.assertTrue(Loader(name, path, compiler = Compiler).cache_is_current())
+    
+    def test_preload_freeze(self):
+        """
+        .preload() should optionally freeze the garbage collector
+        """
+        
+        self.addCleanup(gc.unfreeze)
+        result = preloader.preload([self.directory], workers = 1, freeze = True)
+        self.assertGreater(result['frozen'], 0)
@@ -0,0 +1,71 @@
+import unittest
+import unittest.mock as mock
+from unittest.mock import sentinel
+from import_anything import Reloader, Loader, Finder, Compiler
+
+import importlib
+import os
+import sys
+import tempfile
+
+class TestReloader(unittest.TestCase):
+    suffix = '.reloader-test'
+    
+    def setUp(self):
+        Finder.register(Loader.factory(compiler = Compiler), [self.suffix])
+        self.addCleanup(Finder.unregister, suffixes = [self.suffix])
+        
+        self.directory = tempfile.TemporaryDirectory()
+        sys.path.insert(0, self.directory.name)
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(sys.path.remove, self.directory.name)
+    
+    def write(self, name, source, mtime):
+        path = os.path.join(self.directory.name, name + self.suffix)
+        with open(path, 'w') as file:
+            file.write(source)
+        os.utime(path, (mtime, mtime))
+        importlib.invalidate_caches()
+    
+    def import_module(self, name):
+        self.addCleanup(sys.modules.pop, name, None)
+        return importlib.import_module(name)
+    
+    def test_poll(self):
+        """
+        .poll() should reload only the custom modules that changed
+        """
+        
+        self.write('reloaded_module', 'x = 1\n', 1000)
+        self.write('unchanged_module', 'x = 1\n', 1000)
+        reloaded = self.import_module('reloaded_module')
+        unchanged = self.import_module('unchanged_module')
+        
+        reloader = Reloader()
+        self.assertEqual(reloader.poll(), [])
+        
+        self.write('reloaded_module', 'x = 2\n', 2000)
+        with mock.patch('importlib.reload', wraps = importlib.reload) as reload:
+            self.assertEqual(reloader.poll(), ['reloaded_module'])
+            reload.assert_called_once_with(reloaded)
+        
+        self.assertEqual(reloaded.x, 2)
+        self.assertEqual(unchanged.x, 1)
+        self.assertEqual(reloader.poll(), [])
+    
+    def test_poll_dependents(self):
+        """
+        .poll() should also reload the modules importing a changed module
+        """
+        
+        self.write('child_module', 'x = 1\n', 1000)
+        self.write('parent_module', 'from child_module import x\n', 1000)
+        parent = self.import_module('parent_module')
+        self.import_module('child_module')
+        
+        reloader = Reloader()
+        reloader.poll()
+        
+        self.write('child_module', 'x = 2\n', 2000)
+        self.assertEqual(reloader.poll(), ['child_module', 'parent_module'])
+        self.assertEqual(parent.x, 2)
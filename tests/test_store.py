@@ -0,0 +1,62 @@
+import unittest
+import unittest.mock as mock
+from import_anything import Compiler
+from import_anything.store import DirectoryStore
+
+import os
+import tempfile
+
+class TestDirectoryStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = DirectoryStore(directory.name)
+    
+    def test_key(self):
+        """
+        .key() should depend on the source, compiler and optimization level
+        """
+        
+        class OtherCompiler(Compiler):
+            pass
+        
+        class NewCompiler(Compiler):
+            MAGIC = 1
+        
+        key = self.store.key(b'source', Compiler, 0)
+        self.assertEqual(key, self.store.key(b'source', Compiler, 0))
+        for other in [
+            self.store.key(b'other', Compiler, 0),
+            self.store.key(b'source', OtherCompiler, 0),
+            self.store.key(b'source', NewCompiler, 0),
+            self.store.key(b'source', Compiler, 1),
+        ]:
+            self.assertNotEqual(key, other)
+    
+    def test_put_get(self):
+        """
+        .put() should store data that .get() returns
+        """
+        
+        key = self.store.key(b'source', Compiler, 0)
+        self.assertIsNone(self.store.get(key))
+        self.assertTrue(self.store.put(key, b'data'))
+        self.assertEqual(self.store.get(key), b'data')
+        
+        # no temporary files are left behind
+        self.assertEqual(os.listdir(os.path.dirname(self.store.path(key))), [os.path.basename(self.store.path(key))])
+        self.assertEqual(os.stat(self.store.path(key)).st_mode & 0o777, 0o644)
+    
+    def test_put_failure(self):
+        """
+        .put() should clean up and return False when it can't write
+        """
+        
+        key = self.store.key(b'source', Compiler, 0)
+        with mock.patch('os.replace', side_effect = PermissionError):
+            self.assertFalse(self.store.put(key, b'data'))
+        self.assertIsNone(self.store.get(key))
+        self.assertEqual(os.listdir(os.path.dirname(self.store.path(key))), [])
+        
+        with mock.patch('os.makedirs', side_effect = PermissionError):
+            self.assertFalse(DirectoryStore('/nonexistent').put(key, b'data'))
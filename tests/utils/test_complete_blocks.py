@@ -41,3 +41,20 @@ class TestCompleteBlocks(unittest.TestCase):
         
         result = list(source())
         self.assertEqual(result, [(1, 'block:'), (2, '  block body')])
+    
+    def test_nodes(self):
+        """
+        complete_blocks() should pass ast nodes through, using their col_offset as indent
+        """
+        import ast
+        
+        node = ast.Pass(col_offset = 2)
+        
+        @complete_blocks(indent_by = 2, body = 'pass')
+        def source(block):
+            yield 1, block('block:')
+            yield 2, node
+            yield 3, block('empty block:')
+        
+        result = list(source())
+        self.assertEqual(result, [(1, 'block:'), (2, node), (3, 'empty block:'), (3, '  pass')])
@@ -0,0 +1,31 @@
+import sys
+import types
+import unittest
+from import_anything.utils import encode_locations
+
+@unittest.skipIf(sys.version_info < (3, 11), 'location tables are new in python 3.11')
+class TestLinetable(unittest.TestCase):
+    def test_encode_locations(self):
+        """
+        encode_locations() should reproduce the positions of a code object
+        """
+        
+        source = 'def f(x):\n    return [i\n        for i in x]\n\ny = f(range(100))\n' * 20
+        stack = [compile(source, 'path', 'exec')]
+        while stack:
+            code = stack.pop()
+            stack.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+            
+            table = encode_locations(list(code.co_positions()), code.co_firstlineno)
+            result = code.replace(co_linetable = table)
+            self.assertEqual(list(result.co_positions()), list(code.co_positions()))
+    
+    def test_encode_locations_moved(self):
+        """
+        encode_locations() should allow moving lines before co_firstlineno
+        """
+        
+        code = compile('x = 1\ny = 2\n', 'path', 'exec')
+        positions = [(None if p[0] is None else 12 - p[0], None if p[0] is None else 12 - p[0], p[2], p[3]) for p in code.co_positions()]
+        result = code.replace(co_firstlineno = 1, co_linetable = encode_locations(positions, 1))
+        self.assertEqual(list(result.co_positions()), positions)